@@ -1,30 +1,58 @@
 import copy
+import gzip
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import freeze_support
 import json
 import os
-from typing import List, Optional, Union, Dict, Any
+import platform
+import random
+import time
+from typing import Iterator, List, Optional, Tuple, Union, Dict, Any
 
-from dungeon_despair.domain.utils import ActionType, get_enum_by_value
+from dungeon_despair.domain.utils import ActionType
 import fire
+import numpy as np
 from tqdm.auto import tqdm
 
 from configs import configs, resource_path
 from dungeon_despair.domain.configs import config as ddd_config
 from dungeon_despair.domain.corridor import Corridor
 from dungeon_despair.domain.encounter import Encounter
+from dungeon_despair.domain.entities.enemy import Enemy
 from dungeon_despair.domain.entities.hero import Hero
 from dungeon_despair.domain.attack import Attack
 from dungeon_despair.domain.modifier import Modifier, ModifierType
 from dungeon_despair.domain.level import Level
 from dungeon_despair.domain.room import Room
+from engine.batch_combat import simulate_combats
 from engine.combat_engine import CombatPhase
+from engine.modifier_flags import modifier_type
 from engine.game_engine import GameEngine, GameState
+from engine.message_system import Event
+from engine.cycle_detector import CycleDetector
+from engine.decision import (
+    DecisionKind,
+    apply_decision,
+    current_decision,
+    decode_option,
+    encode_option,
+)
+from engine.profiler import PLAYER_PHASES, Profiler
+from engine.state_hash import TranspositionTable
 from heroes_party import HeroParty
 from player.ai_player import AIPlayer
+from player.base_player import Player
+from player.mcts_player import MCTSPlayer
 from player.random_player import RandomPlayer
-from engine.stress_system import stress_system
-from engine.message_system import msg_system
 from utils import set_ingame_properties
 
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
 
 # create dungeon assets folder if it does not exists
 
@@ -242,6 +270,14 @@ class RunData:
         self.encounters_stress_delta: List[float] = []
         self.encounters_desc: List[str] = []
         self.termination_condition: str = ""
+        # steps left when the run was cut short by a loop or a stalemate
+        self.steps_saved = 0
+        # events, magnitude and stress of each stress source
+        self.stress_breakdown: Dict[str, Dict[str, Any]] = {}
+        # root seed of the game's random streams
+        self.seed: Optional[int] = None
+        # players' decisions, encoded as ints, to replay the run from its seed
+        self.decisions: List[int] = []
 
         self.combat_encounter_desc: str = ""
         self.combat_encounter_stress_pre: float = 0.0
@@ -264,36 +300,127 @@ class RunData:
             "encounters_stress_delta": self.encounters_stress_delta,
             "encounters_desc": self.encounters_desc,
             "termination_condition": self.termination_condition,
+            "steps_saved": self.steps_saved,
+            "stress_breakdown": self.stress_breakdown,
+            "seed": self.seed,
+            "decisions": self.decisions,
         }
 
 
 class SimulatorLogger:
-    def __init__(self, output_filename: str, **kwargs):
+    def __init__(
+        self,
+        output_filename: str,
+        stream: bool = False,
+        compress: bool = False,
+        **kwargs,
+    ):
         self.output_filename = output_filename.replace(".log", ".json")
         self.simulation_data: List[RunData] = []
         self.configs = ddd_config
         self.level: Level = copy.deepcopy(kwargs["level"])
         self.simulation_type: str = kwargs["simulation_type"]
+        # in streaming mode each run is appended to a JSONL file as soon as it ends
+        self.stream = stream
+        self.f = None
+        # engine phases counters, only set when profiling
+        self.profile: Optional[Dict[str, Any]] = None
+        # transposition table statistics, only set when using one
+        self.transpositions: Optional[Dict[str, Any]] = None
+        # steps not simulated thanks to loops and stalemates detection
+        self.steps_saved: Optional[int] = None
+        # runs cut short by loops and stalemates detection
+        self.cycle_terminated_runs: Optional[int] = None
+        if self.stream:
+            base_filename = os.path.splitext(output_filename)[0]
+            self.output_filename = base_filename + (
+                ".jsonl.gz" if compress else ".jsonl"
+            )
+            # the header is written once, in a sidecar file
+            self.meta_filename = base_filename + ".meta.json"
+            with open(self.meta_filename, "w") as f:
+                json.dump(self.header(), f)
+            self.f = (
+                gzip.open(self.output_filename, "wt")
+                if compress
+                else open(self.output_filename, "w")
+            )
 
     @property
     def current_run(self):
         assert len(self.simulation_data) > 0, f"No run has started yet!"
         return self.simulation_data[-1]
 
+    def header(self) -> Dict[str, Any]:
+        return {
+            "configs": self.configs.__dict__,
+            "simulation_type": self.simulation_type,
+            "level": self.level.model_dump_json(),
+        }
+
     def start_run(self):
         self.simulation_data.append(RunData())
 
+    def add_run(self, run_data: RunData):
+        if self.stream:
+            self.f.write(json.dumps(run_data.info(), separators=(",", ":")) + "\n")
+            self.f.flush()
+        else:
+            self.simulation_data.append(run_data)
+
     def save_simulation(self):
-        with open(self.output_filename, "w") as f:
-            json.dump(
-                {
-                    "simulation_data": [x.info() for x in self.simulation_data],
-                    "configs": self.configs.__dict__,
-                    "simulation_type": self.simulation_type,
-                    "level": self.level.model_dump_json(),
-                },
-                f,
-            )
+        stats = {
+            k: v
+            for k, v in [
+                ("profile", self.profile),
+                ("transpositions", self.transpositions),
+                ("steps_saved", self.steps_saved),
+                ("cycle_terminated_runs", self.cycle_terminated_runs),
+            ]
+            if v is not None
+        }
+        if self.stream:
+            self.f.close()
+            if stats:
+                with open(self.meta_filename, "w") as f:
+                    json.dump({**self.header(), **stats}, f)
+        else:
+            with open(self.output_filename, "w") as f:
+                json.dump(
+                    {
+                        "simulation_data": [x.info() for x in self.simulation_data],
+                        **self.header(),
+                        **stats,
+                    },
+                    f,
+                )
+
+
+def iter_simulation_runs(filename: str) -> Iterator[Dict[str, Any]]:
+    """Lazily iterate the runs of a streamed (optionally gzipped) JSONL results file"""
+    with (
+        gzip.open(filename, "rt") if filename.endswith(".gz") else open(filename, "r")
+    ) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load_simulation_run(
+    filename: str, run_n: int
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Get the header and the data of a run from a simulation results file"""
+    if filename.endswith(".jsonl") or filename.endswith(".jsonl.gz"):
+        base_filename = filename[: filename.rindex(".jsonl")]
+        with open(base_filename + ".meta.json", "r") as f:
+            header = json.load(f)
+        for i, run in enumerate(iter_simulation_runs(filename)):
+            if i == run_n:
+                return header, run
+        raise IndexError(f"There is no run {run_n} in {filename}!")
+    with open(filename, "r") as f:
+        header = json.load(f)
+    return header, header["simulation_data"][run_n]
 
 
 class EventsLogger:
@@ -310,9 +437,352 @@ class EventsLogger:
     def end(self) -> None:
         self.f.close()
 
-    def write(self) -> None:
-        for msg in msg_system.get_queue():
-            self.f.write(f"{msg}\n")
+    def write(self, events: List[Event]) -> None:
+        for event in events:
+            self.f.write(f"{event.render()}\n")
+
+
+def derive_run_seed(base_seed: int, run_n: int) -> int:
+    """Derive the RNG seed of a single run from the simulation seed"""
+    return int(np.random.SeedSequence([base_seed, run_n]).generate_state(1)[0])
+
+
+# scenario shared by all runs of a worker process, set once by the pool initializer
+_worker_scenario: Optional[Level] = None
+
+
+def _init_worker(scenario: Level) -> None:
+    global _worker_scenario
+    _worker_scenario = scenario
+
+
+def _simulate_run(
+    run_n: int,
+    run_seed: int,
+    simulation_type: str,
+    scenario: Optional[Level] = None,
+    show_progress: bool = False,
+    profile: bool = False,
+    log_events: bool = True,
+    transpositions: Optional[TranspositionTable] = None,
+    detect_cycles: bool = False,
+    mcts_time_budget: Optional[float] = None,
+    mcts_node_budget: Optional[int] = 200,
+) -> Tuple[RunData, List[Event], Optional[Dict[str, Any]]]:
+    """Simulate a single run from a fresh copy of the scenario"""
+    random.seed(run_seed)
+    run_data = RunData()
+    scenario = copy.deepcopy(scenario if scenario is not None else _worker_scenario)
+    profiler = Profiler() if profile else None
+    events = _simulate_scenario(
+        scenario=scenario,
+        simulation_type=simulation_type,
+        run_data=run_data,
+        seed=run_seed,
+        show_progress=show_progress,
+        profiler=profiler,
+        log_events=log_events,
+        transpositions=transpositions,
+        detect_cycles=detect_cycles,
+        mcts_time_budget=mcts_time_budget,
+        mcts_node_budget=mcts_node_budget,
+    )
+    return run_data, events, profiler.info() if profiler is not None else None
+
+
+def _time_decisions(player: Player, latencies: List[float]) -> None:
+    """Append the wall time of every decision of the player to the latencies"""
+
+    def timed(fn):
+        def wrapped(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+        return wrapped
+
+    for method in PLAYER_PHASES:
+        setattr(player, method, timed(getattr(player, method)))
+
+
+class _BackendsComparison(AIPlayer):
+    """AI player that plays with rollouts, timing and checking the analytic scores"""
+
+    def __init__(self, stats: Dict[str, list]):
+        super().__init__(backend="rollout")
+        self.stats = stats
+
+    def pick_actions(self, **kwargs) -> int:
+        game_engine: GameEngine = kwargs["game_engine"]
+        start = time.perf_counter()
+        analytic = self.score_actions_analytic(game_engine)
+        self.stats["analytic"].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        rollout = self.score_actions_rollout(game_engine, kwargs["actions"])
+        self.stats["rollout"].append(time.perf_counter() - start)
+        choice = rollout.index(min(rollout))
+        self.stats["agree"].append(analytic.index(min(analytic)) == choice)
+        return choice
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # reported in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024 if platform.system() == "Darwin" else 1024)
+
+
+def _simulate_scenario(
+    scenario: Level,
+    simulation_type: str,
+    run_data: RunData,
+    max_steps: int = 2000,
+    show_progress: bool = False,
+    profiler: Optional[Profiler] = None,
+    decision_latencies: Optional[List[float]] = None,
+    log_events: bool = True,
+    players: Optional[Tuple[Player, Player]] = None,
+    transpositions: Optional[TranspositionTable] = None,
+    detect_cycles: bool = False,
+    seed: Optional[int] = None,
+    mcts_time_budget: Optional[float] = None,
+    mcts_node_budget: Optional[int] = 200,
+) -> List[Event]:
+    if players is not None:
+        # Given heroes and enemies players
+        eng = GameEngine(
+            heroes_player=players[0], enemies_player=players[1], seed=seed
+        )
+    elif simulation_type == "random":
+        # Random players
+        eng = GameEngine(
+            heroes_player=RandomPlayer(), enemies_player=RandomPlayer(), seed=seed
+        )
+    elif simulation_type == "ai":
+        # Greedy AI players, their rollouts are sampled so they are never cached
+        eng = GameEngine(
+            heroes_player=AIPlayer(), enemies_player=AIPlayer(), seed=seed
+        )
+    elif simulation_type == "mcts":
+        # Tree search players, stopped by whichever budget runs out first
+        budgets = {"time_budget": mcts_time_budget, "node_budget": mcts_node_budget}
+        eng = GameEngine(
+            heroes_player=MCTSPlayer(**budgets),
+            enemies_player=MCTSPlayer(**budgets),
+            seed=seed,
+        )
+    elif simulation_type == "ai_analytic":
+        # Greedy AI players, scoring actions by their expected stress
+        eng = GameEngine(
+            heroes_player=AIPlayer(backend="analytic", transpositions=transpositions),
+            enemies_player=AIPlayer(backend="analytic", transpositions=transpositions),
+            seed=seed,
+        )
+    else:
+        raise NotImplementedError(f"{simulation_type} is not implemented yet!")
+    # without events log the engine produces no events at all
+    eng.msg_system.muted = not log_events
+    run_data.seed = eng.rng.seed
+    if profiler is not None:
+        eng.enable_profiling(profiler)
+    if decision_latencies is not None:
+        for player in {eng.heroes_player, eng.enemies_player}:
+            _time_decisions(player, decision_latencies)
+    heroes = get_temp_heroes()
+    set_ingame_properties(game_data=scenario, heroes=heroes)
+    eng.heroes = heroes
+    # Set the level
+    eng.set_level(level=scenario)
+    eng.tick()
+    # Simulate until termination or max number of steps is reached
+    t = tqdm(
+        total=max_steps,
+        desc="Simulating steps",
+        leave=False,
+        position=1,
+        disable=not show_progress,
+    )
+    n_step = 0
+    cycle_detector = CycleDetector() if detect_cycles else None
+    while eng.state != GameState.GAME_OVER and n_step < max_steps:
+        # Move to a new room
+        if eng.state == GameState.IDLE:
+            dest = eng.heroes_player.pick_destination(
+                destinations=eng.movement_engine.destinations,
+                unk_areas=eng.movement_engine.unk_areas,
+                game_engine=eng,
+            )
+            run_data.decisions.append(
+                encode_option(eng, DecisionKind.DESTINATION, dest)
+            )
+            eng.move_to(dest=dest)
+        # Loot treasures
+        elif eng.state == GameState.INSPECTING_TREASURE:
+            choice = eng.player.choose_loot_treasure(
+                **{"game_engine": eng}
+            )
+            run_data.decisions.append(encode_option(eng, DecisionKind.LOOT, choice))
+            eng.process_looting(choice=choice)
+        # Disarm traps
+        elif eng.state == GameState.INSPECTING_TRAP:
+            disarm = eng.player.choose_disarm_trap(game_engine=eng)
+            run_data.decisions.append(encode_option(eng, DecisionKind.DISARM, disarm))
+            if disarm:
+                eng.process_disarm()
+        # In combat, choosing position
+        elif (
+            eng.state == GameState.IN_COMBAT
+            and eng.combat_engine.state == CombatPhase.CHOOSE_POSITION
+        ):
+            entity_idx = eng.player.pick_moving(
+                **{
+                    "game_engine": eng,
+                    "attacker_type": type(eng.combat_engine.attacker),
+                    "n_heroes": len(eng.heroes.party),
+                    "n_enemies": len(eng.current_encounter.enemies),
+                }
+            )
+            run_data.decisions.append(encode_option(eng, DecisionKind.MOVE, entity_idx))
+            if entity_idx is not None:
+                eng.process_move(idx=entity_idx)
+            else:
+                move_action = [
+                    action
+                    for action in eng.combat_engine.actions
+                    if eng.targeting.get(action).action_type == ActionType.MOVE
+                ][0]
+                eng.try_cancel_attack(
+                    attack_idx=eng.combat_engine.actions.index(move_action)
+                )
+        # In combat, choosing attack
+        elif (
+            eng.state == GameState.IN_COMBAT
+            and eng.combat_engine.state == CombatPhase.PICK_ATTACK
+        ):
+            action_idx = eng.player.pick_actions(
+                **{"actions": eng.actions, "game_engine": eng}
+            )
+            run_data.decisions.append(
+                encode_option(eng, DecisionKind.ATTACK, action_idx)
+            )
+            eng.process_attack(attack_idx=action_idx)
+        # On end of wave, terminate simulation (we only simulate with fixed heroes, so one wave)
+        elif eng.state == GameState.WAVE_OVER:
+            eng.state = GameState.GAME_OVER
+            eng.msg_system.add_msg(
+                "RUN OVER\tSimulation interrupted: heroes party was wiped out!"
+            )
+        # Update steps counter
+        n_step += 1
+        run_data.n_steps += 1
+        eng.tick()
+        run_data.stress_trace.append(eng.stress_system.stress)
+        t.update(n_step)
+        if (
+            cycle_detector is not None
+            and eng.state != GameState.GAME_OVER
+            and cycle_detector.update(eng)
+        ):
+            if eng.state == GameState.IN_COMBAT:
+                eng.msg_system.add_msg(
+                    "RUN OVER\tSimulation interrupted: combat stalemate!"
+                )
+                run_data.termination_condition = "Combat stalemate"
+            else:
+                eng.msg_system.add_msg(
+                    "RUN OVER\tSimulation interrupted: exploration loop!"
+                )
+                run_data.termination_condition = "Exploration loop"
+            run_data.steps_saved = max_steps - n_step
+            break
+    t.close()
+    # Include message in case max number of steps was reached
+    if n_step >= max_steps:
+        eng.msg_system.add_msg(
+            "RUN OVER\tSimulation interrupted: max number of steps reached!"
+        )
+        run_data.termination_condition = "Max number of steps reached"
+    run_data.stress_breakdown = eng.stress_system.breakdown()
+    return eng.msg_system.get_events()
+
+
+def _replay_run(
+    scenario: Level, seed: int, decisions: List[int], n_steps: int
+) -> Tuple[GameEngine, int]:
+    """Play a run again from its seed and decisions, without any player"""
+    random.seed(seed)
+    eng = GameEngine(heroes_player=None, enemies_player=None, seed=seed)
+    eng.msg_system.muted = True
+    heroes = get_temp_heroes()
+    set_ingame_properties(game_data=scenario, heroes=heroes)
+    eng.heroes = heroes
+    eng.set_level(level=scenario)
+    eng.tick()
+    # same steps as `_simulate_scenario`, with the decisions read from the log
+    n_step, n_decision = 0, 0
+    while eng.state != GameState.GAME_OVER and n_step < n_steps:
+        kind = current_decision(eng)
+        if kind is not None:
+            if n_decision == len(decisions):
+                break
+            option = decode_option(eng, kind, decisions[n_decision])
+            n_decision += 1
+            apply_decision(eng, kind, option)
+        else:
+            if eng.state == GameState.WAVE_OVER:
+                eng.state = GameState.GAME_OVER
+            eng.tick()
+        n_step += 1
+    return eng, n_step
+
+
+def _engine_state(eng: GameEngine, n_step: int) -> Dict[str, Any]:
+    """Summary of the game state, as dumped by `replay`"""
+
+    def entity_state(entity: Union[Hero, Enemy]) -> Dict[str, Any]:
+        return {
+            "name": entity.name,
+            "hp": entity.hp,
+            "max_hp": entity.max_hp,
+            "modifiers": [
+                {
+                    "type": modifier_type(modifier).name,
+                    "turns": modifier.turns,
+                    "amount": modifier.amount,
+                }
+                for modifier in entity.modifiers
+            ],
+        }
+
+    encounter = eng.current_encounter
+    return {
+        "step": n_step,
+        "state": eng.state.name,
+        "wave": eng.wave,
+        "area": eng.scenario.current_room,
+        "encounter_idx": eng.movement_engine.encounter_idx,
+        "enemies_left": eng.enemies_left,
+        "stress": eng.stress_system.stress,
+        "stress_breakdown": eng.stress_system.breakdown(),
+        "heroes": [entity_state(hero) for hero in eng.heroes.party],
+        "enemies": (
+            [entity_state(enemy) for enemy in encounter.enemies]
+            if encounter is not None
+            else []
+        ),
+        "combat": (
+            {
+                "turn": eng.combat_engine.turn_number,
+                "phase": eng.combat_engine.state.name,
+                "attacker": eng.combat_engine.attacker.name,
+            }
+            if eng.state == GameState.IN_COMBAT
+            else None
+        ),
+    }
 
 
 class Simulator:
@@ -323,129 +793,295 @@ class Simulator:
         simulation_type: str,
         simulation_runs: int,
         output_filename: str,
+        workers: int = 1,
+        seed: Optional[int] = None,
+        stream: bool = False,
+        compress: bool = False,
+        profile: bool = False,
+        events: bool = True,
+        transpositions: Optional[str] = None,
+        detect_cycles: bool = False,
+        mcts_time_budget: Optional[float] = None,
+        mcts_node_budget: Optional[int] = 200,
     ) -> None:
+        # the table is shared by the runs of a single process
+        if transpositions is not None and workers > 1:
+            raise ValueError("Transposition tables can only be used with 1 worker!")
         if scenario is not None:
             base_scenario = Level.model_validate_json(scenario)
         else:
             base_scenario = Level.load_as_scenario(scenario_filename)
+        seed = configs.rng_seed if seed is None else seed
+        run_seeds = [derive_run_seed(seed, run_n) for run_n in range(simulation_runs)]
         events_logger = EventsLogger(output_filename=output_filename)
-        events_logger.start_exp()
+        events_logger.start_exp(seed=seed, workers=workers)
         simulation_logger = SimulatorLogger(
             output_filename=output_filename,
+            stream=stream,
+            compress=compress,
             **{"level": base_scenario, "simulation_type": simulation_type},
         )
-        for run_n in tqdm(range(simulation_runs), desc="Simulating...", position=0):
-            # Initialize logger
+        if workers > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(base_scenario,),
+            )
+            results = executor.map(
+                partial(
+                    _simulate_run,
+                    simulation_type=simulation_type,
+                    profile=profile,
+                    log_events=events,
+                    detect_cycles=detect_cycles,
+                    mcts_time_budget=mcts_time_budget,
+                    mcts_node_budget=mcts_node_budget,
+                ),
+                range(simulation_runs),
+                run_seeds,
+                chunksize=max(1, simulation_runs // (workers * 4)),
+            )
+        else:
+            executor = None
+            table = (
+                TranspositionTable.load(transpositions)
+                if transpositions is not None
+                else None
+            )
+            results = (
+                _simulate_run(
+                    run_n=run_n,
+                    run_seed=run_seed,
+                    simulation_type=simulation_type,
+                    scenario=base_scenario,
+                    show_progress=True,
+                    profile=profile,
+                    log_events=events,
+                    transpositions=table,
+                    detect_cycles=detect_cycles,
+                    mcts_time_budget=mcts_time_budget,
+                    mcts_node_budget=mcts_node_budget,
+                )
+                for run_n, run_seed in enumerate(run_seeds)
+            )
+        # counters of all runs, merged as they come back from the workers
+        profiler = Profiler() if profile else None
+        steps_saved, cycle_terminated_runs = 0, 0
+        # Results are yielded in run order, so logs match a serial run with the same seeds
+        for run_n, (run_data, run_events, run_profile) in tqdm(
+            enumerate(results), total=simulation_runs, desc="Simulating...", position=0
+        ):
             events_logger.start_run(run_n)
-            simulation_logger.start_run()
-            # Load the scenario
-            scenario = copy.deepcopy(base_scenario)
-            # Simulate a random game
-            self.__simulate_scenario(
-                scenario, simulation_type, simulation_logger.current_run
+            simulation_logger.add_run(run_data)
+            events_logger.write(run_events)
+            steps_saved += run_data.steps_saved
+            cycle_terminated_runs += run_data.termination_condition in [
+                "Exploration loop",
+                "Combat stalemate",
+            ]
+            if profiler is not None:
+                profiler.merge(run_profile)
+        if profiler is not None:
+            simulation_logger.profile = profiler.info()
+        if detect_cycles:
+            simulation_logger.steps_saved = steps_saved
+            simulation_logger.cycle_terminated_runs = cycle_terminated_runs
+            print(
+                f"Runs cut short by loops and stalemates detection: "
+                f"{cycle_terminated_runs}/{simulation_runs}, steps saved: {steps_saved}"
             )
-            # Log simulation messages
-            events_logger.write()
+        if executor is not None:
+            executor.shutdown()
+        elif table is not None:
+            simulation_logger.transpositions = table.info()
+            # later invocations start from what was simulated here
+            table.save(transpositions)
         # Save logs
         events_logger.end()
         simulation_logger.save_simulation()
 
-    def __simulate_scenario(
+    def replay(
         self,
-        scenario: Level,
-        simulation_type: str,
-        run_data: RunData,
-        max_steps: int = 2000,
+        results_filename: str,
+        run_n: int = 0,
+        step: Optional[int] = None,
+        scenario_filename: Optional[str] = None,
+        output_filename: Optional[str] = None,
     ) -> None:
-        msgs = []
-        if simulation_type == "random":
-            # Random players
-            eng = GameEngine(
-                heroes_player=RandomPlayer(), enemies_player=RandomPlayer()
-            )
-        elif simulation_type == "ai":
-            # Greedy AI players
-            eng = GameEngine(heroes_player=AIPlayer(), enemies_player=AIPlayer())
+        """Replay a simulated run from its seed and decisions, dump the game state"""
+        header, run = load_simulation_run(results_filename, run_n)
+        if run.get("seed", None) is None or "decisions" not in run:
+            raise ValueError(f"Run {run_n} was saved without its seed and decisions!")
+        if scenario_filename is not None:
+            scenario = Level.load_as_scenario(scenario_filename)
         else:
-            raise NotImplementedError(f"{simulation_type} is not implemented yet!")
+            scenario = Level.model_validate_json(header["level"])
+        n_steps = run["n_steps"] if step is None else min(step, run["n_steps"])
+        eng, n_step = _replay_run(
+            scenario=scenario,
+            seed=run["seed"],
+            decisions=run["decisions"],
+            n_steps=n_steps,
+        )
+        state = _engine_state(eng, n_step)
+        # the replayed stress must match the recorded one at the same step
+        state["recorded_stress"] = (
+            run["stress_trace"][n_step - 1] if n_step > 0 else None
+        )
+        if output_filename is not None:
+            with open(output_filename, "w") as f:
+                json.dump(state, f, indent=2)
+        print(json.dumps(state, indent=2))
+
+    def estimate_encounters(
+        self,
+        scenario_filename: str,
+        batch_size: int = 1000,
+        seed: Optional[int] = None,
+        max_turns: int = 100,
+        output_filename: Optional[str] = None,
+    ) -> None:
+        """Estimate the outcomes of each combat encounter of the scenario"""
+        seed = configs.rng_seed if seed is None else seed
+        scenario = Level.load_as_scenario(scenario_filename)
         heroes = get_temp_heroes()
         set_ingame_properties(game_data=scenario, heroes=heroes)
-        eng.heroes = heroes
-        # Set the level
-        eng.set_level(level=scenario)
-        eng.tick()
-        # Simulate until termination or max number of steps is reached
-        t = tqdm(total=max_steps, desc="Simulating steps", leave=False, position=1)
-        n_step = 0
-        while eng.state != GameState.GAME_OVER and n_step < max_steps:
-            # Move to a new room
-            if eng.state == GameState.IDLE:
-                dest = eng.heroes_player.pick_destination(
-                    destinations=eng.movement_engine.destinations,
-                    unk_areas=eng.movement_engine.unk_areas,
-                )
-                eng.move_to(dest=dest)
-            # Loot treasures
-            elif eng.state == GameState.INSPECTING_TREASURE:
-                choice = eng.player.choose_loot_treasure(
-                    **{"game_engine_copy": copy.deepcopy(eng)}
-                )
-                eng.process_looting(choice=choice)
-            # Disarm traps
-            elif eng.state == GameState.INSPECTING_TRAP:
-                if eng.player.choose_disarm_trap():
-                    eng.process_disarm()
-            # In combat, choosing position
-            elif (
-                eng.state == GameState.IN_COMBAT
-                and eng.combat_engine.state == CombatPhase.CHOOSE_POSITION
-            ):
-                entity_idx = eng.player.pick_moving(
-                    **{
-                        "game_engine_copy": copy.deepcopy(eng),
-                        "n_heroes": len(eng.heroes.party),
-                        "n_enemies": len(eng.current_encounter.enemies),
-                    }
-                )
-                if entity_idx is not None:
-                    eng.process_move(idx=entity_idx)
-                else:
-                    move_action = [
-                        action
-                        for action in eng.combat_engine.actions
-                        if get_enum_by_value(ActionType, action.type) == ActionType.MOVE
-                    ][0]
-                    eng.try_cancel_attack(
-                        attack_idx=eng.combat_engine.actions.index(move_action)
+        encounters = [
+            (room.name, room.encounter) for room in scenario.rooms.values()
+        ] + [
+            (f"{corridor.name} ({i})", encounter)
+            for corridor in scenario.corridors.values()
+            for i, encounter in enumerate(corridor.encounters)
+        ]
+        estimates = {}
+        for area_name, encounter in encounters:
+            if len(encounter.enemies) > 0:
+                estimates[area_name] = simulate_combats(
+                    heroes=heroes,
+                    encounter=encounter,
+                    batch_size=batch_size,
+                    seed=seed,
+                    max_turns=max_turns,
+                ).info()
+        if output_filename is not None:
+            with open(output_filename, "w") as f:
+                json.dump(estimates, f, indent=2)
+        print(json.dumps(estimates, indent=2))
+
+    def bench(
+        self,
+        *scenario_filenames: str,
+        simulation_types: Tuple[str, ...] = ("random", "ai"),
+        runs: int = 5,
+        seed: Optional[int] = None,
+        max_steps: int = 2000,
+        output_filename: Optional[str] = None,
+    ) -> None:
+        """Measure the engine throughput on fixed-seed games and report it as JSON"""
+        seed = configs.rng_seed if seed is None else seed
+        results = []
+        for scenario_filename in scenario_filenames:
+            base_scenario = Level.load_as_scenario(scenario_filename)
+            for simulation_type in simulation_types:
+                n_steps, latencies = 0, []
+                start = time.perf_counter()
+                for run_n in range(runs):
+                    run_seed = derive_run_seed(seed, run_n)
+                    random.seed(run_seed)
+                    run_data = RunData()
+                    _simulate_scenario(
+                        scenario=copy.deepcopy(base_scenario),
+                        simulation_type=simulation_type,
+                        run_data=run_data,
+                        seed=run_seed,
+                        max_steps=max_steps,
+                        decision_latencies=latencies,
                     )
-            # In combat, choosing attack
-            elif (
-                eng.state == GameState.IN_COMBAT
-                and eng.combat_engine.state == CombatPhase.PICK_ATTACK
-            ):
-                action_idx = eng.player.pick_actions(
-                    **{"actions": eng.actions, "game_engine_copy": copy.deepcopy(eng)}
+                    n_steps += run_data.n_steps
+                elapsed = time.perf_counter() - start
+                results.append(
+                    {
+                        "scenario": os.path.basename(scenario_filename),
+                        "simulation_type": simulation_type,
+                        "runs": runs,
+                        "steps": n_steps,
+                        "time": elapsed,
+                        "steps_per_sec": n_steps / elapsed,
+                        "runs_per_sec": runs / elapsed,
+                        "decisions": len(latencies),
+                        "decision_latency_p50_ms": (
+                            float(np.percentile(latencies, 50)) * 1000
+                            if latencies
+                            else None
+                        ),
+                        "decision_latency_p99_ms": (
+                            float(np.percentile(latencies, 99)) * 1000
+                            if latencies
+                            else None
+                        ),
+                    }
                 )
-                eng.process_attack(attack_idx=action_idx)
-            # On end of wave, terminate simulation (we only simulate with fixed heroes, so one wave)
-            elif eng.state == GameState.WAVE_OVER:
-                eng.state = GameState.GAME_OVER
-                msgs.append(
-                    "RUN OVER\tSimulation interrupted: heroes party was wiped out!"
+        report = {
+            "seed": seed,
+            "max_steps": max_steps,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "peak_rss_mb": _peak_rss_mb(),
+            "results": results,
+        }
+        if output_filename is not None:
+            with open(output_filename, "w") as f:
+                json.dump(report, f, indent=2)
+        print(json.dumps(report, indent=2))
+
+    def bench_backends(
+        self,
+        *scenario_filenames: str,
+        runs: int = 5,
+        seed: Optional[int] = None,
+        max_steps: int = 2000,
+        output_filename: Optional[str] = None,
+    ) -> None:
+        """Compare the decisions and latency of the AI scoring backends as JSON"""
+        seed = configs.rng_seed if seed is None else seed
+        results = []
+        for scenario_filename in scenario_filenames:
+            base_scenario = Level.load_as_scenario(scenario_filename)
+            stats = {"analytic": [], "rollout": [], "agree": []}
+            for run_n in range(runs):
+                run_seed = derive_run_seed(seed, run_n)
+                random.seed(run_seed)
+                _simulate_scenario(
+                    scenario=copy.deepcopy(base_scenario),
+                    simulation_type="ai",
+                    run_data=RunData(),
+                    seed=run_seed,
+                    max_steps=max_steps,
+                    log_events=False,
+                    players=(_BackendsComparison(stats), _BackendsComparison(stats)),
                 )
-            # Update steps counter
-            n_step += 1
-            run_data.n_steps += 1
-            eng.tick()
-            run_data.stress_trace.append(stress_system.stress)
-            t.update(n_step)
-        # Include message in case max number of steps was reached
-        if n_step >= max_steps:
-            msgs.append(
-                "RUN OVER\tSimulation interrupted: max number of steps reached!"
-            )
-            run_data.termination_condition = "Max number of steps reached"
+            result = {
+                "scenario": os.path.basename(scenario_filename),
+                "runs": runs,
+                "decisions": len(stats["agree"]),
+                "agreement": float(np.mean(stats["agree"])) if stats["agree"] else None,
+            }
+            for backend in ["analytic", "rollout"]:
+                for q in [50, 99]:
+                    result[f"{backend}_latency_p{q}_ms"] = (
+                        float(np.percentile(stats[backend], q)) * 1000
+                        if stats[backend]
+                        else None
+                    )
+            results.append(result)
+        report = {"seed": seed, "max_steps": max_steps, "results": results}
+        if output_filename is not None:
+            with open(output_filename, "w") as f:
+                json.dump(report, f, indent=2)
+        print(json.dumps(report, indent=2))
 
 
 if __name__ == "__main__":
+    # required by the process pool when running as a frozen executable
+    freeze_support()
     fire.Fire(Simulator)
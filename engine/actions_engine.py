@@ -1,12 +1,12 @@
-import random
 from enum import auto, Enum
 
 from dungeon_despair.domain.encounter import Encounter
 from dungeon_despair.domain.entities.hero import Hero
 from dungeon_despair.domain.entities.treasure import Treasure
-from engine.message_system import msg_system
+from engine.message_system import EventKind, MessageSystem
 from engine.modifier_system import ModifierSystem
-from engine.stress_system import stress_system
+from engine.rng import RNGService
+from engine.stress_system import StressSystem
 from heroes_party import HeroParty
 
 
@@ -17,24 +17,42 @@ class LootingChoice(Enum):
 
 
 class ActionEngine:
+    def __init__(
+        self,
+        stress_system: StressSystem,
+        msg_system: MessageSystem,
+        modifier_system: ModifierSystem,
+        rng: RNGService,
+    ):
+        self.stress_system = stress_system
+        self.msg_system = msg_system
+        self.modifier_system = modifier_system
+        self.rng = rng
 
     def resolve_trap_encounter(self, encounter: Encounter, heroes: HeroParty) -> None:
         trap = encounter.traps[0]
-        hero = random.choice(heroes.party)
+        hero = self.rng.traps.choice(heroes.party)
         # in darkest dungeon:
         # chance to disarm: random hero.trap_resist (+40% if trap is spotted) - trap.chance
         p = hero.trap_resist - trap.chance
-        if random.random() <= p:
-            msg_system.add_msg(f"<b>{hero.name}</b> successfully disarms {trap.name}!")
-            stress_system.process_trap(hero=hero, disarmed=True)
+        if self.rng.traps.random() <= p:
+            self.msg_system.add_event(
+                EventKind.TRAP_DISARMED, actor=hero.name, item=trap.name
+            )
+            self.stress_system.process_trap(hero=hero, dmg_dealt=0.0, disarmed=True)
         else:
             dmg_dealt = min(hero.hp, trap.dmg)
             hero.hp -= dmg_dealt
-            msg_system.add_msg(
-                f"<b>{hero.name}</b> fails to disarms {trap.name} and receives <i>{dmg_dealt}</i> damage!"
+            self.msg_system.add_event(
+                EventKind.TRAP_TRIGGERED,
+                actor=hero.name,
+                item=trap.name,
+                amount=dmg_dealt,
+            )
+            self.stress_system.process_trap(
+                hero=hero, dmg_dealt=dmg_dealt, disarmed=False
             )
-            stress_system.process_trap(hero=hero, dmg_dealt=dmg_dealt, disarmed=False)
-            ModifierSystem.try_add_modifier(target=hero, modifier=trap.modifier)
+            self.modifier_system.try_add_modifier(target=hero, modifier=trap.modifier)
         encounter.entities["trap"].pop(0)
 
     def resolve_treasure_encounter(
@@ -47,31 +65,35 @@ class ActionEngine:
         # in darkest dungeon:
         # curios have a ~75% chance of containing loot and ~25% chance of being empty
         # plus other effects, so... we do what we want here
-        if random.random() <= treasure.trapped_chance:
-            if random.random() <= (
+        if self.rng.treasure.random() <= treasure.trapped_chance:
+            if self.rng.treasure.random() <= (
                 hero.trap_resist if choice == LootingChoice.INSPECT_AND_LOOT else 1.0
             ):
-                msg_system.add_msg(
-                    f"<b>{hero.name}</b> successfully disarms the trap in {treasure.name} and loots it!"
+                self.msg_system.add_event(
+                    EventKind.TREASURE_DISARMED, actor=hero.name, item=treasure.name
                 )
-                stress_system.process_disarmed_treasure(
+                self.stress_system.process_disarmed_treasure(
                     inspected=choice == LootingChoice.INSPECT_AND_LOOT
                 )
             else:
-                msg_system.add_msg(
-                    f"<b>{hero.name}</b> triggers the trap in {treasure.name}!"
+                self.msg_system.add_event(
+                    EventKind.TREASURE_TRIGGERED, actor=hero.name, item=treasure.name
                 )
                 dmg_dealt = min(hero.hp, treasure.dmg)
                 hero.hp -= dmg_dealt
-                stress_system.process_triggered_treasure(
+                self.stress_system.process_triggered_treasure(
                     hero=hero,
                     dmg_dealt=dmg_dealt,
                     inspected=choice == LootingChoice.INSPECT_AND_LOOT,
                 )
-                ModifierSystem.try_add_modifier(target=hero, modifier=treasure.modifier)
+                self.modifier_system.try_add_modifier(
+                    target=hero, modifier=treasure.modifier
+                )
         else:
-            msg_system.add_msg(f"<b>{hero.name}</b> loots {treasure.name}!")
-            stress_system.process_safe_treasure(
+            self.msg_system.add_event(
+                EventKind.LOOT, actor=hero.name, item=treasure.name
+            )
+            self.stress_system.process_safe_treasure(
                 inspected=choice == LootingChoice.INSPECT_AND_LOOT
             )
         encounter.entities["treasure"].pop(0)
@@ -0,0 +1,466 @@
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from configs import configs
+from dungeon_despair.domain.encounter import Encounter
+from dungeon_despair.domain.entities.enemy import Enemy
+from dungeon_despair.domain.modifier import Modifier
+from dungeon_despair.domain.utils import ActionType, ModifierType
+from engine.modifier_flags import modifier_type
+from engine.targeting import CompiledAttack
+from heroes_party import Hero, HeroParty
+
+# kinds of actions in the compiled tables
+_NONE, _DAMAGE, _HEAL, _PASS, _MOVE = range(5)
+_KINDS = {
+    ActionType.DAMAGE: _DAMAGE,
+    ActionType.HEAL: _HEAL,
+    ActionType.PASS: _PASS,
+    ActionType.MOVE: _MOVE,
+}
+_MODIFIER_TYPES = list(ModifierType)
+_BLEED = _MODIFIER_TYPES.index(ModifierType.BLEED)
+_HEAL_MOD = _MODIFIER_TYPES.index(ModifierType.HEAL)
+_STUN = _MODIFIER_TYPES.index(ModifierType.STUN)
+_SCARE = _MODIFIER_TYPES.index(ModifierType.SCARE)
+
+
+def _modifier_params(modifier: Modifier) -> tuple:
+    """Get the type index, chance, turns and amount of a modifier"""
+    m_type = _MODIFIER_TYPES.index(modifier_type(modifier))
+    return m_type, modifier.chance, modifier.turns, modifier.amount
+
+
+def _trunc(x: np.ndarray) -> np.ndarray:
+    """Truncate towards zero, like `int` does for the stress changes"""
+    return np.trunc(x).astype(np.int64)
+
+
+class CombatOutcomes:
+    """Outcomes of a batch of combats, one entry per combat"""
+
+    def __init__(
+        self,
+        wiped: np.ndarray,
+        turns: np.ndarray,
+        stress_delta: np.ndarray,
+        timed_out: np.ndarray,
+    ):
+        self.wiped = wiped
+        self.turns = turns
+        self.stress_delta = stress_delta
+        # combats cut at the maximum number of turns, or stuck moving
+        self.timed_out = timed_out
+
+    @property
+    def wipe_rate(self) -> float:
+        return float(self.wiped.mean())
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "batch_size": len(self.wiped),
+            "wipe_rate": self.wipe_rate,
+            "timeout_rate": float(self.timed_out.mean()),
+            "turns_mean": float(self.turns.mean()),
+            "turns_hist": np.bincount(self.turns).tolist(),
+            "stress_delta_mean": float(self.stress_delta.mean()),
+            "stress_delta_std": float(self.stress_delta.std()),
+            "stress_delta_percentiles": {
+                str(q): float(np.percentile(self.stress_delta, q))
+                for q in [5, 25, 50, 75, 95]
+            },
+        }
+
+
+class BatchCombat:
+    """B combats between the same party and encounter, resolved in lockstep.
+
+    Entities are indexed heroes first, then enemies, and their state is kept in
+    arrays of shape (B, entities). Every step resolves one action per combat, chosen
+    like `RandomPlayer` does, following the same rules as `GameEngine` and
+    `CombatEngine`, including the order in which dead entities are removed.
+    """
+
+    def __init__(
+        self,
+        heroes: HeroParty,
+        encounter: Encounter,
+        batch_size: int,
+        rng: np.random.Generator,
+    ):
+        entities: List[Union[Hero, Enemy]] = [*heroes.party, *encounter.enemies]
+        B, N = batch_size, len(entities)
+        self.batch_size = B
+        self.n_entities = N
+        self.n_heroes = len(heroes.party)
+        self.n_positions = max(self.n_heroes, N - self.n_heroes, 1)
+        self.rng = rng
+
+        self.is_hero = np.arange(N) < self.n_heroes
+        self.max_hp = np.array([e.max_hp for e in entities], dtype=float)
+        self.spd = np.array([e.spd for e in entities], dtype=float)
+        self.dodge = np.array([e.dodge for e in entities], dtype=float)
+        self.prot = np.array([e.prot for e in entities], dtype=float)
+        self.stress_resist = np.array(
+            [e.stress_resist if isinstance(e, Hero) else 0.0 for e in entities]
+        )
+        # moves are checked by name in CombatEngine.process_move
+        names = [e.name for e in entities]
+        self.name_ids = np.array([names.index(name) for name in names])
+        self.compile_actions(entities)
+
+        self.hp = np.tile(np.array([e.hp for e in entities], dtype=float), (B, 1))
+        self.alive = np.ones((B, N), dtype=bool)
+        self.pos = np.tile(
+            np.concatenate([np.arange(self.n_heroes), np.arange(N - self.n_heroes)]),
+            (B, 1),
+        )
+        # one slot per modifier type, like the refresh rule of ModifierSystem
+        T = len(_MODIFIER_TYPES)
+        self.present = np.zeros((B, N, T), dtype=bool)
+        self.turns = np.zeros((B, N, T), dtype=np.int64)
+        self.amount = np.zeros((B, N, T), dtype=float)
+        # order of the modifiers in the entity's list
+        self.seq = np.zeros((B, N, T), dtype=np.int64)
+        self.n_added = np.zeros((B, N), dtype=np.int64)
+        for e, entity in enumerate(entities):
+            for modifier in entity.modifiers:
+                m_type, _, turns, amount = _modifier_params(modifier)
+                self.present[:, e, m_type] = True
+                self.turns[:, e, m_type] = turns
+                self.amount[:, e, m_type] = amount
+                self.seq[:, e, m_type] = self.n_added[0, e]
+                self.n_added[:, e] += 1
+
+        self.stress = np.zeros(B, dtype=np.int64)
+        self.turn_number = np.zeros(B, dtype=np.int64)
+        # initiative order of the turn, with dead entities removed
+        self.order = np.zeros((B, N), dtype=np.int64)
+        self.n_order = np.zeros(B, dtype=np.int64)
+        self.cur = np.full(B, -1, dtype=np.int64)
+
+        self.running = np.ones(B, dtype=bool)
+        self.wiped = np.zeros(B, dtype=bool)
+        self.timed_out = np.zeros(B, dtype=bool)
+
+    def compile_actions(self, entities: List[Union[Hero, Enemy]]) -> None:
+        """Compile the attacks of each entity, plus pass and move, into tables"""
+        N = len(entities)
+        K = max(len(entity.attacks) for entity in entities) + 2
+        self.kind = np.full((N, K), _NONE, dtype=np.int64)
+        self.from_bits = np.zeros((N, K), dtype=np.int64)
+        self.to_bits = np.zeros((N, K), dtype=np.int64)
+        self.to_heroes = np.zeros((N, K), dtype=bool)
+        self.accuracy = np.zeros((N, K), dtype=float)
+        self.base_dmg = np.zeros((N, K), dtype=float)
+        self.mod_type = np.full((N, K), -1, dtype=np.int64)
+        self.mod_chance = np.zeros((N, K), dtype=float)
+        self.mod_turns = np.zeros((N, K), dtype=np.int64)
+        self.mod_amount = np.zeros((N, K), dtype=float)
+        for e, entity in enumerate(entities):
+            is_hero = isinstance(entity, Hero)
+            for k, attack in enumerate(entity.attacks):
+                compiled = CompiledAttack(attack)
+                targets_heroes = (compiled.action_type == ActionType.DAMAGE) != is_hero
+                self.kind[e, k] = _KINDS[compiled.action_type]
+                self.from_bits[e, k] = (
+                    compiled.from_heroes if is_hero else compiled.from_enemies
+                )
+                self.to_bits[e, k] = (
+                    compiled.to_heroes if targets_heroes else compiled.to_enemies
+                )
+                self.to_heroes[e, k] = targets_heroes
+                self.accuracy[e, k] = attack.accuracy
+                self.base_dmg[e, k] = attack.base_dmg
+                if attack.modifier is not None:
+                    (
+                        self.mod_type[e, k],
+                        self.mod_chance[e, k],
+                        self.mod_turns[e, k],
+                        self.mod_amount[e, k],
+                    ) = _modifier_params(attack.modifier)
+            self.kind[e, len(entity.attacks)] = _PASS
+            self.kind[e, len(entity.attacks) + 1] = _MOVE
+
+    def group_sizes(self):
+        n_heroes = self.alive[:, : self.n_heroes].sum(axis=1)
+        return n_heroes, self.alive.sum(axis=1) - n_heroes
+
+    def stress_resist_of(self, b: np.ndarray, e: np.ndarray) -> np.ndarray:
+        scare = self.amount[b, e, _SCARE] * self.present[b, e, _SCARE]
+        return np.maximum(0.0, self.stress_resist[e] - scare)
+
+    def entity_at(self) -> np.ndarray:
+        """Get the entity at each position of each group, -1 for empty positions"""
+        slots = np.full((self.batch_size, 2, self.n_positions), -1, dtype=np.int64)
+        b, e = np.nonzero(self.alive)
+        slots[b, (~self.is_hero[e]).astype(np.int64), self.pos[b, e]] = e
+        return slots
+
+    def apply_modifiers(self, mask: np.ndarray, heroes: bool) -> None:
+        """Apply and tick down the modifiers of one group, see ModifierSystem"""
+        group = self.is_hero if heroes else ~self.is_hero
+        sel = mask[:, None] & self.alive & group[None, :]
+        sign = np.where(self.is_hero, 1.0, -1.0)
+        # bleed and heal are applied in the order the modifiers were added
+        bleed_first = self.seq[..., _BLEED] <= self.seq[..., _HEAL_MOD]
+        for first in [True, False]:
+            do_bleed = sel & self.present[..., _BLEED] & (bleed_first == first)
+            dmg = np.where(
+                do_bleed, np.minimum(self.hp, self.amount[..., _BLEED]), 0.0
+            )
+            self.hp -= dmg
+            self.stress += _trunc(dmg * sign).sum(axis=1)
+            do_heal = sel & self.present[..., _HEAL_MOD] & (bleed_first != first)
+            heal = np.where(
+                do_heal,
+                np.minimum(self.max_hp - self.hp, self.amount[..., _HEAL_MOD]),
+                0.0,
+            )
+            self.hp += heal
+            self.stress += _trunc(-heal * sign).sum(axis=1)
+        ticking = sel[..., None] & self.present
+        self.turns -= ticking
+        self.present &= ~(ticking & (self.turns == 0))
+
+    def check_dead(self, mask: np.ndarray) -> None:
+        """Remove dead entities, see GameEngine.check_for_dead"""
+        dead = mask[:, None] & self.alive & (self.hp <= 0)
+        if not dead.any():
+            return
+        self.alive &= ~dead
+        n_dead_heroes = (dead & self.is_hero).sum(axis=1)
+        n_dead_enemies = dead.sum(axis=1) - n_dead_heroes
+        self.stress += n_dead_heroes * configs.game.stress.hero_dies
+        self.stress += n_dead_enemies * configs.game.stress.enemy_dies
+        # the survivors close the gaps in their formation
+        same_group = self.is_hero[:, None] == self.is_hero[None, :]
+        ahead = (
+            self.alive[:, None, :]
+            & same_group[None, :, :]
+            & (self.pos[:, None, :] < self.pos[:, :, None])
+        )
+        self.pos = ahead.sum(axis=2)
+        # dead entities leave the initiative order, but the current index is kept
+        idx = np.arange(self.n_entities)
+        in_order = (idx[None, :] < self.n_order[:, None]) & np.take_along_axis(
+            self.alive, self.order, axis=1
+        )
+        self.order = np.take_along_axis(
+            self.order, np.argsort(~in_order, axis=1, kind="stable"), axis=1
+        )
+        self.n_order = in_order.sum(axis=1)
+
+    def start_turn(self, mask: np.ndarray) -> None:
+        """Roll the initiative of a new turn, see CombatEngine.start_turn"""
+        self.turn_number += mask
+        self.stress += mask * configs.game.stress.turn
+        n_heroes, _ = self.group_sizes()
+        initiative = self.spd * 10 + self.rng.integers(
+            1, 11, size=(self.batch_size, self.n_entities)
+        )
+        initiative = np.where(self.alive, initiative, np.inf)
+        # ties keep the order of the positioned entities
+        list_idx = np.where(self.is_hero, self.pos, n_heroes[:, None] + self.pos)
+        order = np.lexsort((list_idx, initiative), axis=-1)
+        self.order[mask] = order[mask]
+        self.n_order[mask] = self.alive.sum(axis=1)[mask]
+        self.cur[mask] = -1
+
+    def find_next(self, mask: np.ndarray) -> np.ndarray:
+        """Move to the next attacker that is not stunned, see get_next_attacker"""
+        idx = np.arange(self.n_entities)
+        stunned = np.take_along_axis(self.present[..., _STUN], self.order, axis=1)
+        candidates = (
+            mask[:, None]
+            & (idx[None, :] > self.cur[:, None])
+            & (idx[None, :] < self.n_order[:, None])
+            & ~stunned
+        )
+        found = candidates.any(axis=1)
+        self.cur = np.where(found, candidates.argmax(axis=1), self.cur)
+        return found
+
+    def add_modifiers(
+        self, b: np.ndarray, t: np.ndarray, a: np.ndarray, k: np.ndarray
+    ) -> None:
+        """Try to add the modifiers of the actions to the targets"""
+        m_type = self.mod_type[a, k]
+        added = (m_type >= 0) & (self.rng.random(len(b)) <= self.mod_chance[a, k])
+        b, t, a, k, m_type = b[added], t[added], a[added], k[added], m_type[added]
+        new = ~self.present[b, t, m_type]
+        # refreshed modifiers keep their place in the list
+        self.seq[b[new], t[new], m_type[new]] = self.n_added[b[new], t[new]]
+        self.n_added[b[new], t[new]] += 1
+        self.present[b, t, m_type] = True
+        self.turns[b, t, m_type] = self.mod_turns[a, k]
+        self.amount[b, t, m_type] = self.mod_amount[a, k]
+
+    def act(self, mask: np.ndarray) -> None:
+        """Resolve a random action of the current attacker of each combat"""
+        b = np.nonzero(mask)[0]
+        if len(b) == 0:
+            return
+        n_heroes, n_enemies = self.group_sizes()
+        n_heroes, n_enemies = n_heroes[b], n_enemies[b]
+        a = self.order[b, self.cur[b]]
+        a_hero = self.is_hero[a]
+        a_pos = self.pos[b, a]
+        own_n = np.where(a_hero, n_heroes, n_enemies)
+
+        # active actions, see CombatEngine.set_actions_and_targets
+        kind = self.kind[a]
+        target_n = np.where(self.to_heroes[a], n_heroes[:, None], n_enemies[:, None])
+        targeted = self.to_bits[a] & ((1 << target_n) - 1)
+        from_ok = ((self.from_bits[a] >> a_pos[:, None]) & 1) == 1
+        active = ((kind == _DAMAGE) | (kind == _HEAL)) & from_ok & (targeted != 0)
+        active |= kind == _PASS
+        active |= (kind == _MOVE) & (own_n > 1)[:, None]
+        # uniform choice among the active actions, like RandomPlayer.pick_actions
+        pick = np.floor(self.rng.random(len(b)) * active.sum(axis=1))
+        k = (np.cumsum(active, axis=1) > pick[:, None]).argmax(axis=1)
+        chosen = kind[np.arange(len(b)), k]
+        # heroes' stress changes are scaled by their resistance
+        resist_factor = np.where(a_hero, 1 - self.stress_resist_of(b, a), 1.0)
+
+        rows = (chosen == _DAMAGE) | (chosen == _HEAL)
+        if rows.any():
+            slots = self.entity_at()
+            bits = targeted[np.arange(len(b)), k]
+            group = (~self.to_heroes[a, k]).astype(np.int64)
+            for j in range(self.n_positions):
+                r = np.nonzero(rows & (((bits >> j) & 1) == 1))[0]
+                if len(r) == 0:
+                    continue
+                rb, ra, rk = b[r], a[r], k[r]
+                t = slots[rb, group[r], j]
+                damage = chosen[r] == _DAMAGE
+                # damage: hit or miss, see CombatEngine.process_attack
+                hit = damage & (
+                    self.rng.random(len(r))
+                    < np.maximum(0.0, self.accuracy[ra, rk] - self.dodge[t])
+                )
+                hyp_dmg = np.trunc(self.base_dmg[ra, rk] * (1 - self.prot[t]))
+                stress_diff = np.where(hit, hyp_dmg, hyp_dmg / 2) * np.where(
+                    a_hero[r], -resist_factor[r], 1.0
+                )
+                self.hp[rb, t] -= np.where(hit, hyp_dmg, 0.0)
+                # heal: capped at the max hp of the target
+                heal = np.where(
+                    damage,
+                    0.0,
+                    np.minimum(
+                        self.max_hp[t] - self.hp[rb, t], -self.base_dmg[ra, rk]
+                    ),
+                )
+                self.hp[rb, t] += heal
+                stress_diff = np.where(
+                    damage, stress_diff, np.where(self.is_hero[t], -heal, heal)
+                )
+                self.stress[rb] += _trunc(stress_diff)
+                landed = hit | ~damage
+                self.add_modifiers(rb[landed], t[landed], ra[landed], rk[landed])
+
+        rows = chosen == _PASS
+        self.stress[b[rows]] += _trunc(
+            np.where(a_hero[rows], resist_factor[rows], -1.0)
+            * configs.game.stress.passing
+        )
+
+        rows = np.nonzero(chosen == _MOVE)[0]
+        if len(rows) > 0:
+            self.move(b[rows], a[rows], resist_factor[rows], a_hero[rows])
+
+    def move(
+        self,
+        b: np.ndarray,
+        a: np.ndarray,
+        resist_factor: np.ndarray,
+        a_hero: np.ndarray,
+    ) -> None:
+        """Move the attackers in front of a random entity of their group"""
+        # entities with the same name as the attacker are not valid targets
+        valid = (
+            self.alive[b]
+            & (self.is_hero[None, :] == a_hero[:, None])
+            & (self.name_ids[None, :] != self.name_ids[a][:, None])
+        )
+        n_valid = valid.sum(axis=1)
+        # RandomPlayer keeps picking forever, so these combats never end
+        stuck = n_valid == 0
+        self.timed_out[b[stuck]] = True
+        self.running[b[stuck]] = False
+        b, a, a_hero = b[~stuck], a[~stuck], a_hero[~stuck]
+        resist_factor = resist_factor[~stuck]
+        valid, n_valid = valid[~stuck], n_valid[~stuck]
+        pick = np.floor(self.rng.random(len(b)) * n_valid)
+        target = (np.cumsum(valid, axis=1) > pick[:, None]).argmax(axis=1)
+
+        # the attacker is inserted right before the target, see process_move
+        pos = self.pos[b]
+        a_pos = pos[np.arange(len(b)), a][:, None]
+        t_pos = pos[np.arange(len(b)), target][:, None]
+        same = self.alive[b] & (self.is_hero[None, :] == a_hero[:, None])
+        forward = a_pos < t_pos
+        pos = pos - (same & forward & (pos > a_pos) & (pos < t_pos))
+        pos = pos + (same & ~forward & (pos >= t_pos) & (pos < a_pos))
+        pos[np.arange(len(b)), a] = np.where(forward, t_pos - 1, t_pos)[:, 0]
+        self.pos[b] = pos
+        self.stress[b] += _trunc(
+            np.where(a_hero, resist_factor, -1.0) * configs.game.stress.switch_position
+        )
+
+    def run(self, max_turns: int = 100) -> CombatOutcomes:
+        # modifiers of the heroes are applied when entering the encounter
+        self.apply_modifiers(self.running, heroes=True)
+        self.start_turn(self.running)
+        while self.running.any():
+            found = self.find_next(self.running)
+            n_heroes, n_enemies = self.group_sizes()
+            ended = self.running & ((n_heroes == 0) | (n_enemies == 0))
+            self.wiped |= ended & (n_heroes == 0)
+            self.running &= ~ended
+            # end of turn, see GameEngine.tick
+            end_of_turn = self.running & ~found
+            if end_of_turn.any():
+                self.apply_modifiers(end_of_turn, heroes=True)
+                self.apply_modifiers(end_of_turn, heroes=False)
+                self.check_dead(end_of_turn)
+                n_heroes, _ = self.group_sizes()
+                wiped = end_of_turn & (n_heroes == 0)
+                self.wiped |= wiped
+                timed_out = end_of_turn & ~wiped & (self.turn_number >= max_turns)
+                self.timed_out |= timed_out
+                self.running &= ~(wiped | timed_out)
+                end_of_turn &= self.running
+                self.start_turn(end_of_turn)
+                found |= self.find_next(end_of_turn)
+                _, n_enemies = self.group_sizes()
+                self.running &= ~(end_of_turn & (n_enemies == 0))
+            acting = self.running & found
+            self.act(acting)
+            self.check_dead(acting & self.running)
+        return CombatOutcomes(
+            wiped=self.wiped,
+            turns=self.turn_number,
+            stress_delta=self.stress,
+            timed_out=self.timed_out,
+        )
+
+
+def simulate_combats(
+    heroes: HeroParty,
+    encounter: Encounter,
+    batch_size: int,
+    seed: Optional[int] = None,
+    max_turns: int = 100,
+) -> CombatOutcomes:
+    """Play the encounter `batch_size` times with random players on both sides"""
+    combat = BatchCombat(
+        heroes=heroes,
+        encounter=encounter,
+        batch_size=batch_size,
+        rng=np.random.default_rng(seed),
+    )
+    return combat.run(max_turns=max_turns)
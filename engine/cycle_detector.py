@@ -0,0 +1,55 @@
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+from configs import configs
+from engine.combat_engine import CombatPhase
+from engine.game_engine import GameEngine, GameState
+from engine.state_hash import StateHasher
+
+
+class CycleDetector:
+    """Detect a game going around in circles, by counting the recent states.
+
+    A state is the area, the formation, the exact hp and the modifiers of the
+    positioned entities, the enemies left and, in combat, the position of the
+    current attacker. Any progress (eg: an enemy dying) makes every later state
+    new, so a state seen `repeats` times in the last `window` steps means the
+    game is not getting anywhere: in combat, the same attacker faced the same
+    state `repeats` times without anything changing.
+    """
+
+    def __init__(
+        self,
+        window: int = configs.game.cycles.window,
+        repeats: int = configs.game.cycles.repeats,
+    ):
+        self.window = window
+        self.repeats = repeats
+        self.hasher = StateHasher()
+        self.recent: Deque[Tuple] = deque()
+        self.counts: Dict[Tuple, int] = {}
+
+    def update(self, engine: GameEngine) -> bool:
+        """Add the current state, check if it has been repeated too many times"""
+        # the turn order is rerolled every turn, so only the attacker is part of
+        # the state: different entities missing in the same turn are not repeats
+        attacker_idx = -1
+        if engine.state == GameState.IN_COMBAT and engine.combat_engine.state in [
+            CombatPhase.PICK_ATTACK,
+            CombatPhase.CHOOSE_POSITION,
+        ]:
+            attacker_idx = engine.attacker_and_idx[1]
+        key = (
+            self.hasher.hash(engine, turn_order=False),
+            engine.enemies_left,
+            len(engine.heroes.party),
+            attacker_idx,
+        )
+        self.recent.append(key)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        if len(self.recent) > self.window:
+            old = self.recent.popleft()
+            self.counts[old] -= 1
+            if self.counts[old] == 0:
+                del self.counts[old]
+        return self.counts[key] >= self.repeats
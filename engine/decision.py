@@ -0,0 +1,148 @@
+from enum import Enum, auto
+from typing import Any, Hashable, List, Optional, Tuple
+
+from dungeon_despair.domain.encounter import Encounter
+from dungeon_despair.domain.utils import ActionType
+from engine.actions_engine import LootingChoice
+from engine.combat_engine import CombatPhase
+from engine.game_engine import GameEngine, GameState
+from engine.movement_engine import Destination
+from heroes_party import Hero
+
+
+class DecisionKind(Enum):
+    DESTINATION: int = auto()
+    DISARM: int = auto()
+    LOOT: int = auto()
+    ATTACK: int = auto()
+    MOVE: int = auto()
+
+
+def current_decision(engine: GameEngine) -> Optional[DecisionKind]:
+    """Get the decision the game is waiting for, None if there is none"""
+    if engine.state == GameState.IDLE:
+        return DecisionKind.DESTINATION
+    elif engine.state == GameState.INSPECTING_TRAP:
+        return DecisionKind.DISARM
+    elif engine.state == GameState.INSPECTING_TREASURE:
+        return DecisionKind.LOOT
+    elif engine.state == GameState.IN_COMBAT:
+        if engine.combat_engine.state == CombatPhase.PICK_ATTACK:
+            return DecisionKind.ATTACK
+        elif engine.combat_engine.state == CombatPhase.CHOOSE_POSITION:
+            return DecisionKind.MOVE
+    return None
+
+
+def decider_is_hero(engine: GameEngine) -> bool:
+    """Check if the heroes player takes the current decision"""
+    if engine.state == GameState.IN_COMBAT:
+        return isinstance(engine.combat_engine.attacker, Hero)
+    return True
+
+
+def legal_options(engine: GameEngine, kind: DecisionKind) -> List[Any]:
+    """Get the options of a decision, as accepted by `apply_decision`"""
+    if kind == DecisionKind.DESTINATION:
+        return engine.movement_engine.destinations.copy()
+    elif kind == DecisionKind.DISARM:
+        return [True, False]
+    elif kind == DecisionKind.LOOT:
+        return list(LootingChoice)
+    elif kind == DecisionKind.ATTACK:
+        return [i for i, action in enumerate(engine.actions) if action.active]
+    else:
+        # positions to move to, or None to cancel the move
+        attacker, attacker_idx = engine.attacker_and_idx
+        n_heroes = len(engine.heroes.party)
+        if attacker_idx < n_heroes:
+            group, offset = engine.heroes.party, 0
+        else:
+            group, offset = engine.current_encounter.enemies, n_heroes
+        return [
+            offset + i
+            for i, entity in enumerate(group)
+            if entity.name != attacker.name
+        ] + [None]
+
+
+def option_key(option: Any) -> Hashable:
+    """Get a hashable key of a decision option"""
+    return str(option) if isinstance(option, Destination) else option
+
+
+def apply_decision(engine: GameEngine, kind: DecisionKind, option: Any) -> None:
+    """Apply the decision and advance the game, as the simulator does"""
+    if kind == DecisionKind.DESTINATION:
+        engine.move_to(dest=option)
+    elif kind == DecisionKind.DISARM:
+        if option:
+            engine.process_disarm()
+    elif kind == DecisionKind.LOOT:
+        engine.process_looting(choice=option)
+    elif kind == DecisionKind.ATTACK:
+        engine.process_attack(attack_idx=option)
+    elif option is not None:
+        engine.process_move(idx=option)
+    else:
+        move_idx = [
+            engine.targeting.get(action).action_type for action in engine.actions
+        ].index(ActionType.MOVE)
+        engine.try_cancel_attack(attack_idx=move_idx)
+    engine.tick()
+
+
+def encode_option(engine: GameEngine, kind: DecisionKind, option: Any) -> int:
+    """Encode a decision option as an int, before the decision is applied"""
+    if kind == DecisionKind.DESTINATION:
+        return [str(dest) for dest in engine.movement_engine.destinations].index(
+            str(option)
+        )
+    elif kind == DecisionKind.DISARM:
+        return int(option)
+    elif kind == DecisionKind.LOOT:
+        return list(LootingChoice).index(option)
+    elif kind == DecisionKind.MOVE and option is None:
+        return -1
+    return int(option)
+
+
+def decode_option(engine: GameEngine, kind: DecisionKind, code: int) -> Any:
+    """Get the decision option encoded by `encode_option`"""
+    if kind == DecisionKind.DESTINATION:
+        return engine.movement_engine.destinations[code]
+    elif kind == DecisionKind.DISARM:
+        return bool(code)
+    elif kind == DecisionKind.LOOT:
+        return list(LootingChoice)[code]
+    elif kind == DecisionKind.MOVE and code == -1:
+        return None
+    return code
+
+
+def decision_context(engine: GameEngine) -> Tuple:
+    """Get a summary of the game position, to recognise a decision seen before"""
+    return (
+        engine.state,
+        engine.combat_engine.state,
+        (
+            engine.combat_engine.attacker.name
+            if engine.state == GameState.IN_COMBAT
+            else None
+        ),
+        engine.combat_engine.turn_number,
+        engine.scenario.current_room,
+        engine.movement_engine.encounter_idx,
+    )
+
+
+def destination_encounters(engine: GameEngine) -> List[Tuple[str, Encounter]]:
+    """Get the encounters of the areas the party can move to"""
+    encounters = []
+    for dest in engine.movement_engine.destinations:
+        if engine.level_graph.is_room(dest.to):
+            encounters.append((dest.to, engine.scenario.rooms[dest.to].encounter))
+        else:
+            corridor = engine.scenario.corridors[dest.to]
+            encounters.append((dest.to, corridor.encounters[dest.idx]))
+    return encounters
@@ -0,0 +1,214 @@
+import copy
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from dungeon_despair.domain.level import Level
+from engine.actions_engine import LootingChoice
+from engine.decision import (
+    DecisionKind,
+    apply_decision,
+    current_decision,
+    decider_is_hero,
+    legal_options,
+)
+from engine.modifier_flags import MODIFIER_TYPES, modifier_slot
+from engine.game_engine import GameEngine, GameState
+from heroes_party import HeroParty
+from player.base_player import Player
+from player.human_player import HumanPlayer
+from player.random_player import RandomPlayer
+from utils import set_ingame_properties
+
+MAX_HEROES = 4
+MAX_ENEMIES = 4
+MAX_ACTIONS = 8
+MAX_DESTINATIONS = 8
+
+# actions: attacks, move targets (plus cancel), looting choices, destinations
+ATTACK_OFFSET = 0
+MOVE_OFFSET = ATTACK_OFFSET + MAX_ACTIONS
+LOOT_OFFSET = MOVE_OFFSET + MAX_HEROES + 1
+DESTINATION_OFFSET = LOOT_OFFSET + len(LootingChoice)
+N_ACTIONS = DESTINATION_OFFSET + MAX_DESTINATIONS
+
+# per entity: present, hp ratio, hp, dodge, prot, spd, attacking, modifier turns
+ENTITY_FEATURES = 7 + len(MODIFIER_TYPES)
+# decision kind, is room, encounter index, destinations, enemies left (area and
+# level), traps, treasures, stress
+AREA_FEATURES = len(DecisionKind) + 8
+MASK_OFFSET = (MAX_HEROES + MAX_ENEMIES) * ENTITY_FEATURES
+OBS_SIZE = MASK_OFFSET + N_ACTIONS + AREA_FEATURES
+
+
+class GameEnv:
+    """Stepping environment over a GameEngine, the agent plays the heroes.
+
+    Observations are written in a preallocated buffer (`obs`, if given), which
+    is returned by `reset` and `step` and overwritten by the next call. Enemies
+    decisions are taken by the opponent player, disarming traps by the engine
+    rules, so the agent is only asked for its attacks, moves, looting choices
+    and destinations. The reward is the stress avoided by the heroes.
+    """
+
+    def __init__(
+        self,
+        scenario: Level,
+        heroes_factory: Callable[[], HeroParty],
+        opponent: Optional[Player] = None,
+        max_steps: int = 2000,
+        obs: Optional[np.ndarray] = None,
+    ):
+        self.scenario = scenario
+        self.heroes_factory = heroes_factory
+        self.opponent = opponent if opponent is not None else RandomPlayer()
+        self.max_steps = max_steps
+        self.engine: Optional[GameEngine] = None
+        self.n_steps = 0
+
+        self.obs = obs if obs is not None else np.zeros(OBS_SIZE, dtype=np.float32)
+        # views on the observation buffer
+        self.entities_obs = self.obs[:MASK_OFFSET].reshape(
+            MAX_HEROES + MAX_ENEMIES, ENTITY_FEATURES
+        )
+        self.action_mask = self.obs[MASK_OFFSET : MASK_OFFSET + N_ACTIONS]
+        self.area_obs = self.obs[-AREA_FEATURES:]
+
+    def reset(self, seed: Optional[int] = None) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """Start a new game from a fresh copy of the scenario, seeding its streams"""
+        scenario = copy.deepcopy(self.scenario)
+        heroes = self.heroes_factory()
+        set_ingame_properties(game_data=scenario, heroes=heroes)
+        # the agent plays the heroes from outside the engine
+        self.engine = GameEngine(
+            heroes_player=HumanPlayer(), enemies_player=self.opponent, seed=seed
+        )
+        self.engine.msg_system.muted = True
+        self.engine.heroes = heroes
+        self.engine.set_level(level=scenario)
+        self.engine.tick()
+        self.n_steps = 0
+        self.advance()
+        self.write_obs()
+        return self.obs, self.info()
+
+    def step(self, action: int) -> Tuple[np.ndarray, float, bool, bool, Dict[str, Any]]:
+        """Take the agent's decision and play until the next one"""
+        if not self.action_mask[action]:
+            raise ValueError(f"Action {action} is not available!")
+        prev_stress = self.engine.stress_system.stress
+        kind = current_decision(self.engine)
+        apply_decision(self.engine, kind, self.decode(kind, action))
+        self.n_steps += 1
+        self.advance()
+        self.write_obs()
+        reward = float(prev_stress - self.engine.stress_system.stress)
+        terminated = self.engine.state in [GameState.GAME_OVER, GameState.WAVE_OVER]
+        truncated = not terminated and (
+            self.n_steps >= self.max_steps or current_decision(self.engine) is None
+        )
+        return self.obs, reward, terminated, truncated, self.info()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "stress": self.engine.stress_system.stress,
+            "n_steps": self.n_steps,
+            "action_mask": self.action_mask,
+        }
+
+    def advance(self) -> None:
+        """Play the decisions that are not the agent's"""
+        engine = self.engine
+        while engine.state not in [GameState.GAME_OVER, GameState.WAVE_OVER]:
+            kind = current_decision(engine)
+            if kind is None or len(legal_options(engine, kind)) == 0:
+                # nothing to decide, the game cannot go on
+                return
+            if kind == DecisionKind.DISARM:
+                option = True
+            elif not decider_is_hero(engine):
+                option = self.opponent_decision(kind)
+            else:
+                return
+            apply_decision(engine, kind, option)
+            self.n_steps += 1
+
+    def opponent_decision(self, kind: DecisionKind) -> Any:
+        engine = self.engine
+        if kind == DecisionKind.ATTACK:
+            return self.opponent.pick_actions(
+                actions=engine.actions, game_engine=engine
+            )
+        return self.opponent.pick_moving(
+            game_engine=engine,
+            attacker_type=type(engine.combat_engine.attacker),
+            n_heroes=len(engine.heroes.party),
+            n_enemies=len(engine.current_encounter.enemies),
+        )
+
+    def decode(self, kind: DecisionKind, action: int) -> Any:
+        """Convert the action to the option of the decision"""
+        if kind == DecisionKind.ATTACK:
+            return action - ATTACK_OFFSET
+        elif kind == DecisionKind.MOVE:
+            position = action - MOVE_OFFSET
+            return position if position < MAX_HEROES else None
+        elif kind == DecisionKind.LOOT:
+            return list(LootingChoice)[action - LOOT_OFFSET]
+        return self.engine.movement_engine.destinations[action - DESTINATION_OFFSET]
+
+    def write_obs(self) -> None:
+        engine = self.engine
+        self.obs.fill(0.0)
+        in_combat = engine.state == GameState.IN_COMBAT
+        attacker = engine.combat_engine.attacker if in_combat else None
+        enemies = engine.current_encounter.enemies
+        for offset, group, size in [
+            (0, engine.heroes.party, MAX_HEROES),
+            (MAX_HEROES, enemies, MAX_ENEMIES),
+        ]:
+            for i, entity in enumerate(group[:size]):
+                row = self.entities_obs[offset + i]
+                row[0] = 1.0
+                row[1] = entity.hp / entity.max_hp
+                row[2] = entity.hp
+                row[3] = entity.dodge
+                row[4] = entity.prot
+                row[5] = entity.spd
+                row[6] = entity is attacker
+                for modifier in entity.modifiers:
+                    row[7 + modifier_slot(modifier)] += modifier.turns
+
+        kind = current_decision(engine)
+        if kind is not None and engine.state not in [
+            GameState.GAME_OVER,
+            GameState.WAVE_OVER,
+        ]:
+            options = legal_options(engine, kind)
+            if kind == DecisionKind.ATTACK:
+                # attacks past the first MAX_ACTIONS cannot be picked
+                for option in options:
+                    if option < MAX_ACTIONS:
+                        self.action_mask[ATTACK_OFFSET + option] = 1.0
+            elif kind == DecisionKind.MOVE:
+                for option in options:
+                    position = MAX_HEROES if option is None else option
+                    if position <= MAX_HEROES:
+                        self.action_mask[MOVE_OFFSET + position] = 1.0
+            elif kind == DecisionKind.LOOT:
+                self.action_mask[LOOT_OFFSET : LOOT_OFFSET + len(options)] = 1.0
+            elif kind == DecisionKind.DESTINATION:
+                n = min(len(options), MAX_DESTINATIONS)
+                self.action_mask[DESTINATION_OFFSET : DESTINATION_OFFSET + n] = 1.0
+            self.area_obs[list(DecisionKind).index(kind)] = 1.0
+
+        movement_engine = engine.movement_engine
+        area = self.area_obs[len(DecisionKind) :]
+        area[0] = engine.level_graph.is_room(movement_engine.current_room.name)
+        area[1] = movement_engine.encounter_idx
+        area[2] = len(movement_engine.destinations)
+        area[3] = engine.area_enemies[movement_engine.current_room.name]
+        area[4] = engine.enemies_left
+        area[5] = len(engine.current_encounter.traps)
+        area[6] = len(engine.current_encounter.treasures)
+        area[7] = engine.stress_system.stress
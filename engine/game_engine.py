@@ -1,18 +1,25 @@
 from enum import Enum, auto
-import random
-from typing import List, Tuple, Union, Optional
+from typing import Dict, List, Tuple, Union, Optional
 
 from dungeon_despair.domain.attack import Attack
+from dungeon_despair.domain.encounter import Encounter
+from dungeon_despair.domain.entities.enemy import Enemy
 from dungeon_despair.domain.entities.entity import Entity
 from dungeon_despair.domain.level import Level
 from engine.actions_engine import ActionEngine, LootingChoice
-from engine.combat_engine import CombatEngine, CombatPhase
-from engine.message_system import msg_system
+from engine.combat_engine import CombatEngine, CombatPhase, make_extra_actions
+from engine.modifier_flags import ModifierFlagsTable
+from engine.level_graph import LevelGraph
+from engine.message_system import EventKind, MessageSystem
 from engine.modifier_system import ModifierSystem
 from engine.movement_engine import MovementEngine, Destination
-from engine.stress_system import stress_system
+from engine.profiler import Profiler
+from engine.rng import RNGService
+from engine.stress_system import StressSystem
+from engine.targeting import TargetingTable
 from heroes_party import Hero, HeroParty
 from player.base_player import Player, PlayerType
+from utils import reset_entity
 
 
 class GameState(Enum):
@@ -27,16 +34,92 @@ class GameState(Enum):
     GAME_OVER: int = auto()
 
 
+class EngineSnapshot:
+    """Mutable state of a GameEngine, as captured by `GameEngine.snapshot`"""
+
+    def __init__(
+        self,
+        engine: "GameEngine",
+        extra_encounters: Optional[List[Tuple[str, Encounter]]] = None,
+    ):
+        self.state = engine.state
+        self.wave = engine.wave
+        self.level_area = (
+            engine.scenario.current_room if engine.scenario is not None else None
+        )
+        self.combat = engine.combat_engine.snapshot()
+        self.movement = engine.movement_engine.snapshot()
+        self.party = engine.heroes.party.copy() if engine.heroes is not None else []
+        # the current encounter, plus any other the caller is going to play
+        encounters = []
+        if engine.movement_engine.current_room is not None:
+            encounters.append(
+                (
+                    engine.movement_engine.current_room.name,
+                    engine.movement_engine.current_encounter,
+                )
+            )
+        if extra_encounters is not None:
+            encounters.extend(extra_encounters)
+        self.encounters = [
+            (encounter, {k: v.copy() for k, v in encounter.entities.items()})
+            for _, encounter in encounters
+        ]
+        entities = self.party.copy()
+        for _, encounter in encounters:
+            entities.extend(encounter.enemies)
+        # hp and modifiers are the only entity fields that change during play
+        self.entities = [
+            (
+                entity,
+                entity.hp,
+                entity.modifiers.copy(),
+                [modifier.turns for modifier in entity.modifiers],
+            )
+            for entity in entities
+        ]
+        self.enemies_left = engine.enemies_left
+        self.area_enemies = {
+            area_name: engine.area_enemies[area_name] for area_name, _ in encounters
+        }
+        self.stress = engine.stress_system.snapshot()
+        self.rng = engine.rng.snapshot()
+        self.messages = engine.msg_system.queue.copy()
+
+
 class GameEngine:
-    def __init__(self, heroes_player: Player, enemies_player: Player):
+    def __init__(
+        self,
+        heroes_player: Optional[Player],
+        enemies_player: Optional[Player],
+        seed: Optional[int] = None,
+    ):
         self.heroes_player = heroes_player
         self.enemies_player = enemies_player
 
-        self.combat_engine = CombatEngine()
-        self.movement_engine = MovementEngine()
-        self.actions_engine = ActionEngine()
-
-        self.heroes: Optional[HeroParty] = None
+        # per subsystem random streams, all derived from the seed of the game
+        self.rng = RNGService(seed)
+
+        # stun and stress resistance of the entities, updated as modifiers change
+        self.modifier_flags = ModifierFlagsTable()
+        # stress and messages are per game, so many engines can run side by side
+        self.stress_system = StressSystem(self.modifier_flags)
+        self.msg_system = MessageSystem()
+        # attacks positions, compiled once when the level and the party are set
+        self.targeting = TargetingTable()
+        # pass and move, shared by the combat engines of this game
+        self.extra_actions = make_extra_actions()
+        self.targeting.compile(self.extra_actions)
+        self.level_graph: Optional[LevelGraph] = None
+        # opt-in, see `enable_profiling`
+        self.profiler: Optional[Profiler] = None
+        self.reset_engines()
+
+        # enemies left in the level, kept up to date as they die or regenerate
+        self.enemies_left = 0
+        self.area_enemies: Dict[str, int] = {}
+
+        self._heroes: Optional[HeroParty] = None
 
         self.state = GameState.LOADING
         self.scenario: Optional[Level] = None
@@ -47,14 +130,54 @@ class GameEngine:
         """Set the scenario and prepare to play"""
         self.scenario = level
         self.state = GameState.IDLE
+        self.targeting.compile_level(level)
+        self.modifier_flags.add_level(level)
+        # the layout never changes, so the graph is only rebuilt for a new level
+        if self.level_graph is None or self.level_graph.level is not level:
+            self.level_graph = LevelGraph(level)
+        self.count_enemies()
 
         # TODO: Temporary fix, should be reset individually
-        self.combat_engine = CombatEngine()
-        self.movement_engine = MovementEngine()
-        self.actions_engine = ActionEngine()
+        self.reset_engines()
 
         self.move_to(dest=Destination(to=self.scenario.current_room, idx=-1))
 
+    def reset_engines(self) -> None:
+        """Create the engines, sharing this game's stress and messages"""
+        self.modifier_system = ModifierSystem(
+            stress_system=self.stress_system,
+            msg_system=self.msg_system,
+            rng=self.rng,
+            modifier_flags=self.modifier_flags,
+        )
+        self.combat_engine = CombatEngine(
+            stress_system=self.stress_system,
+            msg_system=self.msg_system,
+            modifier_system=self.modifier_system,
+            targeting=self.targeting,
+            rng=self.rng,
+            extra_actions=self.extra_actions,
+        )
+        self.movement_engine = MovementEngine(
+            stress_system=self.stress_system,
+            msg_system=self.msg_system,
+            level_graph=self.level_graph,
+        )
+        self.actions_engine = ActionEngine(
+            stress_system=self.stress_system,
+            msg_system=self.msg_system,
+            modifier_system=self.modifier_system,
+            rng=self.rng,
+        )
+        if self.profiler is not None:
+            self.profiler.instrument_engines(self)
+
+    def enable_profiling(self, profiler: Profiler) -> None:
+        """Time the phases of this game with the profiler"""
+        self.profiler = profiler
+        profiler.instrument_game(self)
+        profiler.instrument_engines(self)
+
     def restart_level_from_room(self, room_name: str) -> None:
         self.scenario.current_room = room_name
         self.set_level(self.scenario)
@@ -65,7 +188,7 @@ class GameEngine:
         def try_combat():
             if len(self.movement_engine.current_encounter.enemies) > 0:
                 self.state = GameState.IN_COMBAT
-                ModifierSystem.apply_and_tick_modifiers(
+                self.modifier_system.apply_and_tick_modifiers(
                     self.heroes.party
                 )  # Apply now in case there is a stun
                 self.combat_engine.start_encounter(
@@ -79,16 +202,16 @@ class GameEngine:
         def try_trap():
             if len(self.movement_engine.current_encounter.traps) > 0:
                 self.state = GameState.INSPECTING_TRAP
-                ModifierSystem.apply_and_tick_modifiers(self.heroes.party)
+                self.modifier_system.apply_and_tick_modifiers(self.heroes.party)
                 trap = self.movement_engine.current_encounter.traps[0]
-                msg_system.add_msg(f"You find <b>{trap.name}</b>!")
+                self.msg_system.add_event(EventKind.FOUND, item=trap.name)
 
         def try_treasure():
             if len(self.movement_engine.current_encounter.treasures) > 0:
                 self.state = GameState.INSPECTING_TREASURE
-                ModifierSystem.apply_and_tick_modifiers(self.heroes.party)
+                self.modifier_system.apply_and_tick_modifiers(self.heroes.party)
                 treasure = self.movement_engine.current_encounter.treasures[0]
-                msg_system.add_msg(f"You find <b>{treasure.name}</b>!")
+                self.msg_system.add_event(EventKind.FOUND, item=treasure.name)
 
         # Check for dead entities
         self.check_for_dead()
@@ -112,9 +235,9 @@ class GameEngine:
                 self.combat_engine.tick(heroes=self.heroes)
             if self.combat_engine.state == CombatPhase.END_OF_TURN:
                 # Apply and tick down modifiers that are still active to heroes
-                ModifierSystem.apply_and_tick_modifiers(self.heroes.party)
+                self.modifier_system.apply_and_tick_modifiers(self.heroes.party)
                 # Apply modifiers that are still active to enemies, if there are any
-                ModifierSystem.apply_and_tick_modifiers(
+                self.modifier_system.apply_and_tick_modifiers(
                     self.movement_engine.current_encounter.enemies
                 )
                 # Check for dead entities
@@ -135,7 +258,7 @@ class GameEngine:
                 if self.state == GameState.IDLE:
                     try_treasure()
         if self.state == GameState.IDLE:
-            ModifierSystem.apply_and_tick_modifiers(self.heroes.party)
+            self.modifier_system.apply_and_tick_modifiers(self.heroes.party)
             self.check_wave_over()
             # Check for dead entities
             self.check_for_dead()
@@ -147,8 +270,21 @@ class GameEngine:
             level=self.scenario, dest=dest
         ):
             self.movement_engine.move_to(level=self.scenario, dest=dest)
-            if self.heroes_player.type == PlayerType.AI:
-                self.heroes_player.update_visited_areas(dest)
+            # no players when a run is replayed from its decisions
+            player = self.heroes_player
+            if player is not None and player.type == PlayerType.AI:
+                player.update_visited_areas(dest)
+
+    @property
+    def heroes(self) -> Optional[HeroParty]:
+        return self._heroes
+
+    @heroes.setter
+    def heroes(self, heroes: Optional[HeroParty]) -> None:
+        self._heroes = heroes
+        if heroes is not None:
+            self.targeting.compile_entities(heroes.party)
+            self.modifier_flags.add_party(heroes)
 
     @property
     def current_room(self):
@@ -203,6 +339,7 @@ class GameEngine:
                 dead_entities.append(
                     self.heroes.party.pop(self.heroes.party.index(hero))
                 )
+        n_dead_heroes = len(dead_entities)
         for enemy in self.movement_engine.current_encounter.enemies:
             if enemy.hp <= 0:
                 dead_entities.append(
@@ -210,10 +347,14 @@ class GameEngine:
                         self.movement_engine.current_encounter.enemies.index(enemy)
                     )
                 )
+        n_dead_enemies = len(dead_entities) - n_dead_heroes
+        if n_dead_enemies > 0:
+            self.enemies_left -= n_dead_enemies
+            self.area_enemies[self.movement_engine.current_room.name] -= n_dead_enemies
         if self.state == GameState.IN_COMBAT:
             self.combat_engine.process_dead(dead_entities=dead_entities)
-        stress_system.process_dead(dead_entities)
-        msg_system.process_dead(dead_entities)
+        self.stress_system.process_dead(dead_entities)
+        self.msg_system.process_dead(dead_entities)
 
     def process_disarm(self) -> None:
         """Process disarming a trap"""
@@ -225,36 +366,89 @@ class GameEngine:
         """Process looting a treasure"""
         encounter = self.movement_engine.current_encounter
         treasure = encounter.treasures[0]
-        hero = random.choice(self.heroes.party)
+        hero = self.rng.treasure.choice(self.heroes.party)
         if choice == LootingChoice.LOOT or choice == LootingChoice.INSPECT_AND_LOOT:
             self.actions_engine.resolve_treasure_encounter(
                 treasure=treasure, hero=hero, encounter=encounter, choice=choice
             )
         else:
-            msg_system.ignore_looting(hero=hero, treasure=treasure)
-            stress_system.process_ignore_looting(hero=hero, treasure=treasure)
+            self.msg_system.ignore_looting(hero=hero, treasure=treasure)
+            self.stress_system.process_ignore_looting(hero=hero, treasure=treasure)
 
     def targeted(self, idx: int) -> List[int]:
         """Get the indices of the positioned entities currently targeted"""
         return self.combat_engine.targets_by_action[idx]
 
+    def snapshot(
+        self, extra_encounters: Optional[List[Tuple[str, Encounter]]] = None
+    ) -> EngineSnapshot:
+        """Capture the mutable game state, so it can be restored after simulating ahead.
+
+        Only the current encounter is captured, plus the `(area name, encounter)`
+        pairs in `extra_encounters`, so simulations should not play other encounters.
+        """
+        return EngineSnapshot(self, extra_encounters=extra_encounters)
+
+    def restore(self, token: EngineSnapshot) -> None:
+        """Restore the game state captured by `snapshot`; the same token can be restored many times"""
+        self.state = token.state
+        self.wave = token.wave
+        if token.level_area is not None:
+            self.scenario.current_room = token.level_area
+        self.combat_engine.restore(token.combat)
+        self.movement_engine.restore(token.movement)
+        if self.heroes is not None:
+            self.heroes.party[:] = token.party
+        for encounter, encounter_entities in token.encounters:
+            for k, v in encounter_entities.items():
+                encounter.entities[k][:] = v
+        for entity, hp, modifiers, turns in token.entities:
+            entity.hp = hp
+            entity.modifiers = modifiers.copy()
+            for modifier, n in zip(modifiers, turns):
+                modifier.turns = n
+            self.modifier_flags.get(entity).load()
+        self.enemies_left = token.enemies_left
+        self.area_enemies.update(token.area_enemies)
+        self.stress_system.restore(token.stress)
+        self.rng.restore(token.rng)
+        self.msg_system.queue = token.messages.copy()
+
+    def count_enemies(self) -> None:
+        """Count the enemies left in each area of the level"""
+        self.area_enemies = {}
+        for room in self.scenario.rooms.values():
+            self.area_enemies[room.name] = len(room.encounter.enemies)
+        for corridor in self.scenario.corridors.values():
+            self.area_enemies[corridor.name] = sum(
+                len(encounter.enemies) for encounter in corridor.encounters
+            )
+        self.enemies_left = sum(self.area_enemies.values())
+
+    def regenerate_entity(
+        self, ref_level: Level, entity: Entity, location: str
+    ) -> None:
+        """Restore an entity of the reference level in the current level"""
+        added = reset_entity(
+            ref_level=ref_level,
+            curr_level=self.scenario,
+            entity=entity,
+            location=location,
+        )
+        if isinstance(entity, Enemy):
+            self.enemies_left += added
+            self.area_enemies[location] += added
+            self.modifier_flags.load([entity])
+
     def check_wave_over(self) -> None:
         if len(self.heroes.party) == 0:
             self.state = GameState.WAVE_OVER
-            msg_system.add_msg(
-                f"<b>Wave #{self.wave + 1} is over</b>: all heroes are dead!"
-            )
+            self.msg_system.add_event(EventKind.WAVE_OVER, amount=self.wave + 1)
 
     def check_game_over(self) -> None:
         """Check if the game is over (based on the scenario objective)"""
         # TODO: The game over check for heroes should depend on the scenario objective
-        n_enemies_left = 0
-        for room in self.scenario.rooms.values():
-            n_enemies_left += len(room.encounter.enemies)
-        for corridor in self.scenario.corridors.values():
-            for encounter in corridor.encounters:
-                n_enemies_left += len(encounter.enemies)
-        if n_enemies_left == 0:
+        if self.enemies_left == 0:
             self.state = GameState.GAME_OVER
-            stress_system.score += stress_system.stress
-            msg_system.add_msg(f"<b>Game over</b>: dungeon has been cleared!")
+            self.stress_system.score += self.stress_system.stress
+            self.msg_system.add_event(EventKind.GAME_OVER)
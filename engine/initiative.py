@@ -0,0 +1,95 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from engine.rng import RNGStream
+
+
+class InitiativeQueue:
+    """Turn order of a combat turn, rolled once and presorted.
+
+    Dead entities are tombstoned in place instead of being removed from the
+    array, so removals and next attacker lookups do not shift the entities.
+    The order still plays out as if the dead were removed from a list while
+    the index of the current attacker stays the same: each entity that dies at
+    or before the current attacker makes the next lookup skip one entity.
+    """
+
+    def __init__(self):
+        self.order: List[Any] = []
+        self.alive: List[bool] = []
+        self.positions: Dict[int, int] = {}
+        self.cursor = -1
+        self.skips = 0
+
+    def roll(self, entities: List[Any], rng: RNGStream) -> None:
+        """Roll the initiative of the entities for a new turn"""
+        # Turn order is determined semi-randomly: 1d10+Speed, one roll per entity.
+        rolls = [rng.randint(1, 10) for _ in entities]
+        initiative = [entity.spd * 10 + roll for entity, roll in zip(entities, rolls)]
+        # stable sort, ties keep the order of the entities
+        order = sorted(range(len(entities)), key=initiative.__getitem__)
+        self.order = [entities[i] for i in order]
+        self.alive = [True] * len(order)
+        self.positions = {id(entity): i for i, entity in enumerate(self.order)}
+        self.cursor = -1
+        self.skips = 0
+
+    def next_attacker(self, is_stunned: Callable[[Any], bool]) -> Optional[Any]:
+        """Advance to the next entity that can attack, if any"""
+        skips = self.skips
+        for i in range(self.cursor + 1, len(self.order)):
+            if not self.alive[i]:
+                continue
+            if skips > 0:
+                skips -= 1
+            elif not is_stunned(self.order[i]):
+                self.cursor = i
+                self.skips = 0
+                return self.order[i]
+        return None
+
+    def remove(self, entity: Any) -> None:
+        i = self.positions.pop(id(entity))
+        self.alive[i] = False
+        if i <= self.cursor:
+            self.skips += 1
+
+    @property
+    def attacker(self) -> Any:
+        if self.cursor < 0:
+            # like indexing the turn order at -1
+            return self.remaining()[-1]
+        if self.skips == 0:
+            return self.order[self.cursor]
+        remaining = self.remaining()
+        if len(remaining) == 0:
+            raise IndexError("No entity at the current attacker's index")
+        return remaining[0]
+
+    def remaining(self) -> List[Any]:
+        """Get the current attacker and the entities still to attack"""
+        if self.cursor < 0:
+            return [e for e, alive in zip(self.order, self.alive) if alive]
+        start = self.cursor if self.skips == 0 else self.cursor + 1
+        remaining = [
+            entity
+            for entity, alive in zip(self.order[start:], self.alive[start:])
+            if alive
+        ]
+        # each death up to the current index shifted one more entity before it
+        return remaining[max(self.skips - 1, 0) :]
+
+    def snapshot(self) -> Tuple:
+        return (
+            self.order,
+            self.alive.copy(),
+            self.positions.copy(),
+            self.cursor,
+            self.skips,
+        )
+
+    def restore(self, token: Tuple) -> None:
+        order, alive, positions, self.cursor, self.skips = token
+        # the order is only replaced by new rolls, never changed in place
+        self.order = order
+        self.alive = alive.copy()
+        self.positions = positions.copy()
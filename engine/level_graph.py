@@ -0,0 +1,57 @@
+import hashlib
+from typing import Dict, List, Tuple
+
+from dungeon_despair.domain.level import Level
+
+
+class LevelGraph:
+    """Index of the rooms and corridors of a level, built once per level"""
+
+    def __init__(self, level: Level):
+        self.level = level
+        # identity of the level as given, to key caches shared by many runs
+        digest = hashlib.blake2b(
+            level.model_dump_json().encode(), digest_size=8
+        ).digest()
+        self.fingerprint = int.from_bytes(digest, "little")
+        self.area_names: List[str] = [*level.rooms.keys(), *level.corridors.keys()]
+        self.area_ids: Dict[str, int] = {
+            name: i for i, name in enumerate(self.area_names)
+        }
+        self.n_rooms = len(level.rooms)
+        # corridors connected to each room, in the order given by the level
+        self.room_corridors: Dict[str, Tuple[str, ...]] = {
+            room_name: tuple(
+                corridor.name for corridor in level.get_corridors_by_room(room_name)
+            )
+            for room_name in level.rooms.keys()
+        }
+        self.corridor_rooms: Dict[str, Tuple[str, str]] = {}
+        self.corridor_lengths: Dict[str, int] = {}
+        self.corridor_by_rooms: Dict[Tuple[str, str], str] = {}
+        for corridor in level.corridors.values():
+            self.corridor_rooms[corridor.name] = (corridor.room_from, corridor.room_to)
+            self.corridor_lengths[corridor.name] = corridor.length
+            self.corridor_by_rooms[(corridor.room_from, corridor.room_to)] = (
+                corridor.name
+            )
+            self.corridor_by_rooms[(corridor.room_to, corridor.room_from)] = (
+                corridor.name
+            )
+        self.__rooms_beyond: Dict[str, int] = {}
+
+    def is_room(self, area_name: str) -> bool:
+        return self.area_ids[area_name] < self.n_rooms
+
+    def get_corridor(self, room_a: str, room_b: str) -> str:
+        """Get the name of the corridor between two rooms, in either order"""
+        return self.corridor_by_rooms[(room_a, room_b)]
+
+    def rooms_beyond(self, corridor_name: str) -> int:
+        """Get the number of rooms reachable through the corridor"""
+        if corridor_name not in self.__rooms_beyond:
+            rooms, _ = self.level.get_level_subset(
+                corridor=self.level.corridors[corridor_name]
+            )
+            self.__rooms_beyond[corridor_name] = len(rooms)
+        return self.__rooms_beyond[corridor_name]
@@ -1,28 +1,151 @@
-from typing import List, Union
+from contextlib import contextmanager
+from enum import Enum, auto
+from typing import Any, List, Union
 
 from dungeon_despair.domain.entities.enemy import Enemy
 from dungeon_despair.domain.entities.hero import Hero
 from dungeon_despair.domain.entities.treasure import Treasure
 
 
+class EventKind(Enum):
+    TEXT: int = auto()
+    NEW_ENCOUNTER: int = auto()
+    NEW_TURN: int = auto()
+    ATTACKING: int = auto()
+    PASS: int = auto()
+    HIT: int = auto()
+    MISS: int = auto()
+    HEAL: int = auto()
+    MOVE: int = auto()
+    CANNOT_MOVE: int = auto()
+    ENTER_ROOM: int = auto()
+    ENTER_CORRIDOR: int = auto()
+    UNREACHABLE: int = auto()
+    TRAP_DISARMED: int = auto()
+    TRAP_TRIGGERED: int = auto()
+    TREASURE_DISARMED: int = auto()
+    TREASURE_TRIGGERED: int = auto()
+    LOOT: int = auto()
+    IGNORE_LOOT: int = auto()
+    MODIFIER_DAMAGE: int = auto()
+    MODIFIER_HEAL: int = auto()
+    MODIFIER_REFRESH: int = auto()
+    MODIFIER_ADDED: int = auto()
+    FOUND: int = auto()
+    DEAD: int = auto()
+    WAVE_OVER: int = auto()
+    GAME_OVER: int = auto()
+
+
+# text of each kind of event, filled with the event fields when rendered
+_TEMPLATES = {
+    EventKind.TEXT: "{item}",
+    EventKind.NEW_ENCOUNTER: "<b><i>### NEW ENCOUNTER</i></b>",
+    EventKind.NEW_TURN: "<b>Turn {amount}</b>",
+    EventKind.ATTACKING: "Attacking: <b>{actor}</b>",
+    EventKind.PASS: "<b>{actor}</b> passes!",
+    EventKind.HIT: (
+        "<b>{actor}</b>: {item} <i>{amount}</i> damage dealt to <b>{target}</b>!"
+    ),
+    EventKind.MISS: "<b>{actor}</b>: {item} at {target} but misses!",
+    EventKind.HEAL: "<b>{actor}</b>: {item} heals <b>{target}</b> by <i>{amount}</i>!",
+    EventKind.MOVE: "<b>{actor}</b> moves in <b>{target}</b> position!",
+    EventKind.CANNOT_MOVE: "<b>{actor}</b> can only move within its party!",
+    EventKind.ENTER_ROOM: "You enter <b>{target}</b>: <i>{item}</i>",
+    EventKind.ENTER_CORRIDOR: (
+        "You enter the corridor that connects <b>{actor}</b> to <b>{target}</b>"
+    ),
+    EventKind.UNREACHABLE: "You can't reach <b>{target}</b> from <b>{actor}</b>!",
+    EventKind.TRAP_DISARMED: "<b>{actor}</b> successfully disarms {item}!",
+    EventKind.TRAP_TRIGGERED: (
+        "<b>{actor}</b> fails to disarms {item} and receives <i>{amount}</i> damage!"
+    ),
+    EventKind.TREASURE_DISARMED: (
+        "<b>{actor}</b> successfully disarms the trap in {item} and loots it!"
+    ),
+    EventKind.TREASURE_TRIGGERED: "<b>{actor}</b> triggers the trap in {item}!",
+    EventKind.LOOT: "<b>{actor}</b> loots {item}!",
+    EventKind.IGNORE_LOOT: "{actor} ignores {item}... For now.",
+    EventKind.MODIFIER_DAMAGE: "<b>{target}</b> takes {amount} damage from {item}!",
+    EventKind.MODIFIER_HEAL: "<b>{target}</b> heals {amount} points via {item}!",
+    EventKind.MODIFIER_REFRESH: "<b>{target}</b>'s {item} refreshes!",
+    EventKind.MODIFIER_ADDED: "<b>{target}</b> receives a {item} modifier!",
+    EventKind.FOUND: "You find <b>{item}</b>!",
+    EventKind.DEAD: "{target} is dead!",
+    EventKind.WAVE_OVER: "<b>Wave #{amount} is over</b>: all heroes are dead!",
+    EventKind.GAME_OVER: "<b>Game over</b>: dungeon has been cleared!",
+}
+
+
+class Event:
+    """Something that happened in the game, rendered to text only when needed"""
+
+    __slots__ = ("kind", "actor", "target", "item", "amount")
+
+    def __init__(
+        self,
+        kind: EventKind,
+        actor: str = "",
+        target: str = "",
+        item: Any = "",
+        amount: Any = None,
+    ):
+        self.kind = kind
+        self.actor = actor
+        self.target = target
+        self.item = item
+        self.amount = amount
+
+    def render(self) -> str:
+        return _TEMPLATES[self.kind].format(
+            actor=self.actor, target=self.target, item=self.item, amount=self.amount
+        )
+
+    def __str__(self):
+        return self.render()
+
+
 class MessageSystem:
-    def __init__(self):
-        self.queue = []
+    def __init__(self, muted: bool = False):
+        self.queue: List[Event] = []
+        # a muted system drops all events, eg: during rollouts or batch runs
+        self.muted = muted
+
+    def add_event(
+        self,
+        kind: EventKind,
+        actor: str = "",
+        target: str = "",
+        item: Any = "",
+        amount: Any = None,
+    ) -> None:
+        if not self.muted:
+            self.queue.append(Event(kind, actor, target, item, amount))
+
+    @contextmanager
+    def mute(self):
+        """Drop all events added within the context"""
+        muted = self.muted
+        self.muted = True
+        try:
+            yield
+        finally:
+            self.muted = muted
 
     def add_msg(self, msg: str) -> None:
-        self.queue.append(msg)
+        self.add_event(EventKind.TEXT, item=msg)
 
-    def get_queue(self) -> List[str]:
-        q = self.queue.copy()
+    def get_events(self) -> List[Event]:
+        q = self.queue
         self.queue = []
         return q
 
+    def get_queue(self) -> List[str]:
+        return [event.render() for event in self.get_events()]
+
     def process_dead(self, dead_entities: List[Union[Hero, Enemy]]):
         for entity in dead_entities:
-            self.add_msg(msg=f"{entity.name} is dead!")
+            self.add_event(EventKind.DEAD, target=entity.name)
 
     def ignore_looting(self, hero: Hero, treasure: Treasure):
-        self.add_msg(msg=f"{hero.name} ignores {treasure.name}... For now.")
-
-
-msg_system = MessageSystem()
+        self.add_event(EventKind.IGNORE_LOOT, actor=hero.name, item=treasure.name)
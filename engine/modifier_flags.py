@@ -0,0 +1,81 @@
+from typing import Dict, Iterable, Union
+
+from dungeon_despair.domain.entities.enemy import Enemy
+from dungeon_despair.domain.level import Level
+from dungeon_despair.domain.modifier import Modifier, ModifierType
+from heroes_party import Hero, HeroParty
+
+MODIFIER_TYPES = list(ModifierType)
+# modifier types by member or raw value, coerced once instead of on every check
+_MODIFIER_TYPES_BY_VALUE: Dict = {
+    **{m_type: m_type for m_type in MODIFIER_TYPES},
+    **{m_type.value: m_type for m_type in MODIFIER_TYPES},
+}
+_MODIFIER_SLOTS = {m_type: i for i, m_type in enumerate(MODIFIER_TYPES)}
+
+
+def modifier_type(modifier: Modifier) -> ModifierType:
+    return _MODIFIER_TYPES_BY_VALUE[modifier.type]
+
+
+def modifier_slot(modifier: Modifier) -> int:
+    return _MODIFIER_SLOTS[_MODIFIER_TYPES_BY_VALUE[modifier.type]]
+
+
+class ModifierFlags:
+    """Whether an entity is stunned and its stress resistance net of scares.
+
+    Read on every attacker lookup and stress change, and loaded again from the
+    entity whenever its modifiers change.
+    """
+
+    __slots__ = ("entity", "base_stress_resist", "stunned", "stress_resist")
+
+    def __init__(self, entity: Union[Hero, Enemy]):
+        self.entity = entity
+        self.base_stress_resist = (
+            entity.stress_resist if isinstance(entity, Hero) else 0.0
+        )
+        self.load()
+
+    def load(self) -> None:
+        self.stunned = False
+        scare = 0.0
+        for modifier in self.entity.modifiers:
+            m_type = modifier_type(modifier)
+            if m_type == ModifierType.STUN:
+                self.stunned = True
+            elif m_type == ModifierType.SCARE:
+                scare += modifier.amount
+        # no negative resist
+        self.stress_resist = max(0.0, self.base_stress_resist - scare)
+
+
+class ModifierFlagsTable:
+    """Modifier flags of the party and of the enemies of a level, by entity"""
+
+    def __init__(self):
+        self.flags: Dict[int, ModifierFlags] = {}
+
+    def add_party(self, heroes: HeroParty) -> None:
+        self.load(heroes.party)
+
+    def add_level(self, level: Level) -> None:
+        for room in level.rooms.values():
+            self.load(room.encounter.enemies)
+        for corridor in level.corridors.values():
+            for encounter in corridor.encounters:
+                self.load(encounter.enemies)
+
+    def get(self, entity: Union[Hero, Enemy]) -> ModifierFlags:
+        """Get the flags of the entity, creating them if it was added afterwards"""
+        flags = self.flags.get(id(entity), None)
+        if flags is None or flags.entity is not entity:
+            flags = ModifierFlags(entity)
+            self.flags[id(entity)] = flags
+        return flags
+
+    def load(self, entities: Iterable[Union[Hero, Enemy]]) -> None:
+        """Read the modifiers of the entities again, eg: after they are regenerated"""
+        for entity in entities:
+            self.flags[id(entity)] = ModifierFlags(entity)
@@ -1,55 +1,84 @@
 import copy
-import random
 from typing import List, Union
 
 from dungeon_despair.domain.entities.enemy import Enemy
 from dungeon_despair.domain.entities.hero import Hero
 from dungeon_despair.domain.modifier import Modifier
-from dungeon_despair.domain.utils import get_enum_by_value, ModifierType
+from dungeon_despair.domain.utils import ModifierType
 
-from engine.message_system import msg_system
-from engine.stress_system import stress_system
+from engine.modifier_flags import ModifierFlagsTable, modifier_type
+from engine.message_system import EventKind, MessageSystem
+from engine.rng import RNGService
+from engine.stress_system import StressSystem
 
 
 class ModifierSystem:
-    @staticmethod
-    def apply_and_tick_modifiers(entities: List[Union[Hero, Enemy]]) -> None:
+    def __init__(
+        self,
+        stress_system: StressSystem,
+        msg_system: MessageSystem,
+        rng: RNGService,
+        modifier_flags: ModifierFlagsTable,
+    ):
+        self.stress_system = stress_system
+        self.msg_system = msg_system
+        self.rng = rng
+        # kept up to date with the entities changed here
+        self.modifier_flags = modifier_flags
+
+    def modifiers_changed(self, entity: Union[Hero, Enemy]) -> None:
+        """Update the flags of an entity whose modifiers changed"""
+        self.modifier_flags.get(entity).load()
+
+    def apply_and_tick_modifiers(self, entities: List[Union[Hero, Enemy]]) -> None:
         for entity in entities:
+            if len(entity.modifiers) == 0:
+                continue
             for modifier in entity.modifiers:
-                m_type = get_enum_by_value(ModifierType, modifier.type)
+                m_type = modifier_type(modifier)
                 if m_type == ModifierType.BLEED:
                     dmg = min(entity.hp, modifier.amount)
                     entity.hp -= dmg
-                    stress_system.process_bleed(dmg=dmg, entity=entity)
-                    msg_system.add_msg(
-                        f"<b>{entity.name}</b> takes {modifier.amount} damage from {modifier.type}!"
+                    self.stress_system.process_bleed(dmg=dmg, entity=entity)
+                    self.msg_system.add_event(
+                        EventKind.MODIFIER_DAMAGE,
+                        target=entity.name,
+                        item=modifier.type,
+                        amount=modifier.amount,
                     )
                 elif m_type == ModifierType.HEAL:
                     heal = min(entity.max_hp - entity.hp, modifier.amount)
                     entity.hp += heal
-                    stress_system.process_heal(heal=heal, entity=entity)
-                    msg_system.add_msg(
-                        f"<b>{entity.name}</b> heals {heal} points via {modifier.type}!"
+                    self.stress_system.process_heal(heal=heal, entity=entity)
+                    self.msg_system.add_event(
+                        EventKind.MODIFIER_HEAL,
+                        target=entity.name,
+                        item=modifier.type,
+                        amount=heal,
                     )
                 modifier.turns -= 1
             entity.modifiers = [m for m in entity.modifiers if m.turns != 0]
+            self.modifiers_changed(entity)
 
-    @staticmethod
-    def try_add_modifier(target: Union[Hero, Enemy], modifier: Modifier) -> None:
+    def try_add_modifier(self, target: Union[Hero, Enemy], modifier: Modifier) -> None:
         if modifier is not None:
-            if random.random() <= modifier.chance:
+            if self.rng.modifiers.random() <= modifier.chance:
                 # check if target already has this type of modifier
+                m_type = modifier_type(modifier)
                 for i, existing_modifier in enumerate(target.modifiers):
-                    if existing_modifier.type == modifier.type:
+                    if modifier_type(existing_modifier) == m_type:
                         # refresh existing modifier
-                        target.modifiers[i] = modifier
-                        msg_system.add_msg(
-                            f"<b>{target.name}</b>'s {modifier.type} refreshes!"
+                        target.modifiers[i] = copy.deepcopy(modifier)
+                        self.msg_system.add_event(
+                            EventKind.MODIFIER_REFRESH,
+                            target=target.name,
+                            item=modifier.type,
                         )
                         break
                 else:
                     # add new modifier to target
                     target.modifiers.append(copy.deepcopy(modifier))
-                    msg_system.add_msg(
-                        f"<b>{target.name}</b> receives a {modifier.type} modifier!"
+                    self.msg_system.add_event(
+                        EventKind.MODIFIER_ADDED, target=target.name, item=modifier.type
                     )
+                self.modifiers_changed(target)
@@ -1,12 +1,12 @@
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 from dungeon_despair.domain.corridor import Corridor
 from dungeon_despair.domain.encounter import Encounter
 from dungeon_despair.domain.level import Level
 from dungeon_despair.domain.room import Room
-from dungeon_despair.domain.utils import Direction, make_corridor_name
-from engine.message_system import msg_system
-from engine.stress_system import stress_system
+from engine.level_graph import LevelGraph
+from engine.message_system import EventKind, MessageSystem
+from engine.stress_system import StressSystem
 
 
 class Destination:
@@ -22,7 +22,16 @@ class Destination:
 
 
 class MovementEngine:
-    def __init__(self):
+    def __init__(
+        self,
+        stress_system: StressSystem,
+        msg_system: MessageSystem,
+        level_graph: Optional[LevelGraph],
+    ):
+        self.stress_system = stress_system
+        self.msg_system = msg_system
+        self.level_graph = level_graph
+
         self.encounter_idx = -1
         self.current_room: Optional[Union[Corridor, Room]] = None
         self.destinations: List[Destination] = []
@@ -48,11 +57,18 @@ class MovementEngine:
         """Compute all available destinations for the current encounter"""
         destinations = []
         if isinstance(self.current_room, Room):
-            for corridor in level.get_corridors_by_room(level.current_room):
-                if corridor.room_from == self.current_room.name:
-                    destinations.append(Destination(corridor.name, 0))
-                elif corridor.room_to == self.current_room.name:
-                    destinations.append(Destination(corridor.name, corridor.length - 1))
+            room_name = self.current_room.name
+            for corridor_name in self.level_graph.room_corridors[room_name]:
+                room_from, room_to = self.level_graph.corridor_rooms[corridor_name]
+                if room_from == room_name:
+                    destinations.append(Destination(corridor_name, 0))
+                elif room_to == room_name:
+                    destinations.append(
+                        Destination(
+                            corridor_name,
+                            self.level_graph.corridor_lengths[corridor_name] - 1,
+                        )
+                    )
         else:
             if self.encounter_idx == 0:
                 destinations.append(Destination(self.current_room.name, 1))
@@ -76,32 +92,19 @@ class MovementEngine:
     ) -> Dict[Destination, int]:
         unk_areas = {}
         for destination in self.destinations:
-            if destination.to in level.rooms.keys():
-                n_rooms = 0
-                for direction in Direction:
-                    if level.connections[destination.to][direction] != "":
-                        corridor_name_a = make_corridor_name(
-                            room_from_name=destination.to,
-                            room_to_name=level.connections[destination.to][direction],
-                        )
-                        if corridor_name_a in level.corridors.keys():
-                            corridor = level.corridors[corridor_name_a]
-                        else:
-                            corridor_name_b = make_corridor_name(
-                                room_from_name=level.connections[destination.to][
-                                    direction
-                                ],
-                                room_to_name=destination.to,
-                            )
-                            corridor = level.corridors[corridor_name_b]
-                        if corridor.name != level.current_room:
-                            rooms, _ = level.get_level_subset(corridor=corridor)
-                            n_rooms += len(rooms)
-                unk_areas[str(destination)] = n_rooms
+            if self.level_graph.is_room(destination.to):
+                # rooms beyond every other corridor leaving the destination room
+                unk_areas[str(destination)] = sum(
+                    self.level_graph.rooms_beyond(corridor_name)
+                    for corridor_name in self.level_graph.room_corridors[
+                        destination.to
+                    ]
+                    if corridor_name != level.current_room
+                )
             else:
-                corridor = level.corridors[destination.to]
-                rooms, _ = level.get_level_subset(corridor=corridor)
-                unk_areas[str(destination)] = len(rooms)
+                unk_areas[str(destination)] = self.level_graph.rooms_beyond(
+                    destination.to
+                )
         return unk_areas
 
     def move_to(self, level: Level, dest: Destination):
@@ -117,21 +120,43 @@ class MovementEngine:
             self.unk_areas = self.compute_unk_areas(level, prev_area)
             if prev_area is None or self.current_room.name != prev_area.name:
                 if isinstance(self.current_room, Room):
-                    msg_system.add_msg(
-                        f"You enter <b>{self.current_room.name}</b>: <i>{self.current_room.description}</i>"
+                    self.msg_system.add_event(
+                        EventKind.ENTER_ROOM,
+                        target=self.current_room.name,
+                        item=self.current_room.description,
                     )
                 else:
-                    msg_system.add_msg(
-                        f"You enter the corridor that connects <b>{self.current_room.room_from}</b> to <b>{self.current_room.room_to}</b>"
+                    self.msg_system.add_event(
+                        EventKind.ENTER_CORRIDOR,
+                        actor=self.current_room.room_from,
+                        target=self.current_room.room_to,
                     )
-            stress_system.process_movement()
+            self.stress_system.process_movement()
 
     def reachable(self, level: Level, dest: Destination) -> bool:
         """Check if a destination is reachable from the current encounter"""
         if dest in self.destinations:
             return True
         else:
-            msg_system.add_msg(
-                f"You can't reach <b>{dest.to}</b> from <b>{level.current_room}</b>!"
+            self.msg_system.add_event(
+                EventKind.UNREACHABLE, actor=level.current_room, target=dest.to
             )
             return False
+
+    def snapshot(self) -> Tuple:
+        """Capture the current position in the level"""
+        return (
+            self.encounter_idx,
+            self.current_room,
+            self.destinations,
+            self.unk_areas,
+        )
+
+    def restore(self, token: Tuple) -> None:
+        """Restore the position captured by `snapshot`"""
+        (
+            self.encounter_idx,
+            self.current_room,
+            self.destinations,
+            self.unk_areas,
+        ) = token
@@ -0,0 +1,107 @@
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+# methods timed on each object, by class name
+ENGINE_PHASES = {
+    "GameEngine": [
+        "tick",
+        "move_to",
+        "process_attack",
+        "process_move",
+        "process_disarm",
+        "process_looting",
+        "check_for_dead",
+    ],
+    "CombatEngine": [
+        "tick",
+        "start_turn",
+        "set_actions_and_targets",
+        "process_attack",
+        "process_move",
+    ],
+    "MovementEngine": ["move_to", "compute_destinations", "compute_unk_areas"],
+    "ModifierSystem": ["apply_and_tick_modifiers", "try_add_modifier"],
+}
+PLAYER_PHASES = [
+    "pick_actions",
+    "pick_moving",
+    "pick_destination",
+    "choose_disarm_trap",
+    "choose_loot_treasure",
+]
+
+
+class Profiler:
+    """Call counts and cumulative wall time of the engine phases.
+
+    Profiling is opt-in: nothing is timed unless the profiler is attached to an engine
+    with `GameEngine.enable_profiling`, which wraps the methods of that engine only.
+    Times are inclusive, so a player decision also counts the engine calls it makes.
+    """
+
+    def __init__(self):
+        # (phase, game state, combat phase) -> [calls, seconds]
+        self.counters: Dict[Tuple[str, str, str], list] = {}
+
+    def record(self, key: Tuple[str, str, str], elapsed: float) -> None:
+        counter = self.counters.get(key, None)
+        if counter is None:
+            self.counters[key] = [1, elapsed]
+        else:
+            counter[0] += 1
+            counter[1] += elapsed
+
+    def wrap(self, engine: Any, phase: str, fn: Callable) -> Callable:
+        def timed(*args, **kwargs):
+            key = (phase, engine.state.name, engine.combat_engine.state.name)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(key, time.perf_counter() - start)
+
+        return timed
+
+    def instrument(self, obj: Any, engine: Any, methods: List[str]) -> None:
+        """Replace the methods of the object with timed ones"""
+        name = obj.__class__.__name__
+        for method in methods:
+            fn = getattr(obj, method)
+            setattr(obj, method, self.wrap(engine, f"{name}.{method}", fn))
+
+    def instrument_game(self, engine: Any) -> None:
+        """Time the game engine and its players' decisions"""
+        self.instrument(engine, engine, ENGINE_PHASES["GameEngine"])
+        for player in {engine.heroes_player, engine.enemies_player}:
+            self.instrument(player, engine, PLAYER_PHASES)
+
+    def instrument_engines(self, engine: Any) -> None:
+        """Time the engines of the game, which are recreated for every level"""
+        for obj in [
+            engine.combat_engine,
+            engine.movement_engine,
+            engine.modifier_system,
+        ]:
+            self.instrument(obj, engine, ENGINE_PHASES[obj.__class__.__name__])
+
+    def merge(self, info: Dict[str, Any]) -> None:
+        """Add the counters of another profiler, as returned by `info`"""
+        for phase, game_states in info.items():
+            for game_state, combat_phases in game_states.items():
+                for combat_phase, counter in combat_phases.items():
+                    key = (phase, game_state, combat_phase)
+                    if key not in self.counters:
+                        self.counters[key] = [0, 0.0]
+                    self.counters[key][0] += counter["calls"]
+                    self.counters[key][1] += counter["time"]
+
+    def info(self) -> Dict[str, Any]:
+        info = {}
+        for (phase, game_state, combat_phase), (calls, elapsed) in sorted(
+            self.counters.items()
+        ):
+            info.setdefault(phase, {}).setdefault(game_state, {})[combat_phase] = {
+                "calls": calls,
+                "time": elapsed,
+            }
+        return info
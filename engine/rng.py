@@ -0,0 +1,97 @@
+import random
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# streams of the game rules, captured by snapshots and reseeded by rollouts
+GAME_STREAMS = ("combat", "initiative", "modifiers", "traps", "treasure")
+# the players' own stream, it moves on even when the game is rolled back
+STREAMS = (*GAME_STREAMS, "policy")
+
+
+class RNGStream:
+    """Seeded stream of uniforms, drawn from a NumPy generator in blocks.
+
+    Drawing a block at a time keeps the cost of a single roll to a list lookup.
+    The generator state is only read when a block is drawn, so snapshots are
+    just references to the current block.
+    """
+
+    def __init__(self, seed_seq: np.random.SeedSequence, block_size: int = 256):
+        self.block_size = block_size
+        self.reseed(seed_seq)
+
+    def reseed(self, seed_seq: np.random.SeedSequence) -> None:
+        self.generator = np.random.Generator(np.random.PCG64(seed_seq))
+        # drawn on the first roll, as many streams are reseeded and never used
+        self.block: List[float] = []
+        self.pos = 0
+        self.state = self.generator.bit_generator.state
+
+    def random(self) -> float:
+        """Get a uniform in [0, 1)"""
+        if self.pos == len(self.block):
+            self.block = self.generator.random(self.block_size).tolist()
+            self.state = self.generator.bit_generator.state
+            self.pos = 0
+        u = self.block[self.pos]
+        self.pos += 1
+        return u
+
+    def randint(self, a: int, b: int) -> int:
+        """Get an integer in [a, b], both included"""
+        return a + int(self.random() * (b - a + 1))
+
+    def choice(self, seq: Sequence[Any]) -> Any:
+        return seq[int(self.random() * len(seq))]
+
+    def getrandbits(self, k: int) -> int:
+        return int(self.random() * (1 << k))
+
+    def snapshot(self) -> Tuple:
+        return self.block, self.pos, self.state
+
+    def restore(self, token: Tuple) -> None:
+        block, self.pos, state = token
+        if block is not self.block:
+            # blocks are never changed in place, the generator has to catch up
+            self.generator.bit_generator.state = state
+            self.block, self.state = block, state
+
+
+class RNGService:
+    """Independent seeded streams for the subsystems of a game.
+
+    Every stream is derived from the root seed, so a game is replayed exactly
+    from its seed and decisions, no matter how the streams interleave.
+    """
+
+    def __init__(self, seed: Optional[int] = None, block_size: int = 256):
+        # unseeded games follow the global random module, eg: as seeded by the GUI
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self.streams: Dict[str, RNGStream] = {
+            name: RNGStream(seed_seq, block_size)
+            for name, seed_seq in zip(
+                STREAMS, np.random.SeedSequence(self.seed).spawn(len(STREAMS))
+            )
+        }
+        self.combat = self.streams["combat"]
+        self.initiative = self.streams["initiative"]
+        self.modifiers = self.streams["modifiers"]
+        self.traps = self.streams["traps"]
+        self.treasure = self.streams["treasure"]
+        self.policy = self.streams["policy"]
+
+    def reseed(self, seed: int) -> None:
+        """Reseed the game streams, eg: to sample other outcomes in a rollout"""
+        seed_seqs = np.random.SeedSequence(seed).spawn(len(GAME_STREAMS))
+        for name, seed_seq in zip(GAME_STREAMS, seed_seqs):
+            self.streams[name].reseed(seed_seq)
+
+    def snapshot(self) -> Tuple:
+        """Capture the game streams, the policy stream is not rolled back"""
+        return tuple(self.streams[name].snapshot() for name in GAME_STREAMS)
+
+    def restore(self, token: Tuple) -> None:
+        for name, stream_token in zip(GAME_STREAMS, token):
+            self.streams[name].restore(stream_token)
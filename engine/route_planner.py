@@ -0,0 +1,128 @@
+from typing import Dict, List, Optional, Set
+
+from engine.game_engine import GameEngine
+from engine.level_graph import LevelGraph
+from engine.movement_engine import Destination
+
+
+class RoutePlanner:
+    """Visiting order of the areas of a level that still have enemies.
+
+    The route is a DFS tour over the rooms and corridor cells, starting from the
+    party's position and pruned of the branches without enemies. Larger branches
+    are visited last, and the route ends at the last area with enemies, so the
+    longest walks back are never taken. Following the route takes O(1) per step;
+    it is only planned again if the party leaves it or enemies regenerate.
+    """
+
+    def __init__(self, level_graph: LevelGraph):
+        self.level_graph = level_graph
+        level = level_graph.level
+        # neighbours of every cell, as the movement engine connects them
+        self.neighbours: Dict[str, List[Destination]] = {}
+        for room_name, corridors in level_graph.room_corridors.items():
+            self.neighbours[str(Destination(room_name, -1))] = [
+                Destination(
+                    corridor_name,
+                    (
+                        0
+                        if level_graph.corridor_rooms[corridor_name][0] == room_name
+                        else level_graph.corridor_lengths[corridor_name] - 1
+                    ),
+                )
+                for corridor_name in corridors
+            ]
+        for corridor_name, (room_from, room_to) in level_graph.corridor_rooms.items():
+            length = level_graph.corridor_lengths[corridor_name]
+            for idx in range(length):
+                cells = []
+                if idx > 0:
+                    cells.append(Destination(corridor_name, idx - 1))
+                else:
+                    cells.append(Destination(room_from, -1))
+                if idx < length - 1:
+                    cells.append(Destination(corridor_name, idx + 1))
+                else:
+                    cells.append(Destination(room_to, -1))
+                self.neighbours[str(Destination(corridor_name, idx))] = cells
+        self.route: List[Destination] = []
+        self.step = 0
+        # cells of the route that still have enemies
+        self.pending: Set[str] = set()
+        self.enemies_left = 0
+
+    def has_enemies(self, cell: Destination) -> bool:
+        level = self.level_graph.level
+        if self.level_graph.is_room(cell.to):
+            return len(level.rooms[cell.to].encounter.enemies) > 0
+        return len(level.corridors[cell.to].encounters[cell.idx].enemies) > 0
+
+    def plan(self, start: Destination) -> None:
+        """Plan the route from the given cell"""
+        # spanning tree of the level, by depth first search
+        children: Dict[str, List[Destination]] = {}
+        order = [start]
+        seen = {str(start)}
+        stack = [start]
+        while stack:
+            cell = stack.pop()
+            children[str(cell)] = []
+            for neighbour in self.neighbours[str(cell)]:
+                if str(neighbour) not in seen:
+                    seen.add(str(neighbour))
+                    children[str(cell)].append(neighbour)
+                    order.append(neighbour)
+                    stack.append(neighbour)
+        # number of cells with enemies in each subtree, children before parents
+        targets: Dict[str, int] = {}
+        for cell in reversed(order):
+            targets[str(cell)] = int(self.has_enemies(cell)) + sum(
+                targets[str(child)] for child in children[str(cell)]
+            )
+        # tour of the branches with enemies, the largest ones last
+        self.route = [start]
+        stack = [(start, self.needed_children(children, targets, start))]
+        while stack:
+            cell, todo = stack[-1]
+            if todo:
+                child = todo.pop(0)
+                self.route.append(child)
+                stack.append((child, self.needed_children(children, targets, child)))
+            else:
+                stack.pop()
+                if stack:
+                    self.route.append(stack[-1][0])
+        self.pending = {str(cell) for cell in self.route if self.has_enemies(cell)}
+        # no need to walk back from the last cell with enemies
+        while len(self.route) > 1 and str(self.route[-1]) not in self.pending:
+            self.route.pop()
+        self.step = 0
+
+    @staticmethod
+    def needed_children(
+        children: Dict[str, List[Destination]],
+        targets: Dict[str, int],
+        cell: Destination,
+    ) -> List[Destination]:
+        needed = [child for child in children[str(cell)] if targets[str(child)] > 0]
+        return sorted(needed, key=lambda child: targets[str(child)])
+
+    def next_destination(self, game_engine: GameEngine) -> Optional[Destination]:
+        """Get the next cell of the route, None if the route cannot be followed"""
+        movement_engine = game_engine.movement_engine
+        current = Destination(movement_engine.current_room.name, -1)
+        if not self.level_graph.is_room(current.to):
+            current.idx = movement_engine.encounter_idx
+        # the current cell has been cleared, if it had enemies
+        self.pending.discard(str(current))
+        off_route = self.step >= len(self.route) or self.route[self.step] != current
+        if off_route or game_engine.enemies_left > self.enemies_left:
+            self.plan(current)
+        self.enemies_left = game_engine.enemies_left
+        if len(self.pending) == 0 or self.step + 1 >= len(self.route):
+            return None
+        dest = self.route[self.step + 1]
+        if dest not in movement_engine.destinations:
+            return None
+        self.step += 1
+        return dest
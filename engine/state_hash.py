@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple, Union
+
+from configs import configs
+from dungeon_despair.domain.entities.enemy import Enemy
+from engine.game_engine import GameEngine, GameState
+from heroes_party import Hero
+
+
+def zobrist_key(feature: Tuple) -> int:
+    """Get the random 64 bits key of a feature, the same in every process"""
+    digest = hashlib.blake2b(repr(feature).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class StateHasher:
+    """Zobrist hash of the decision state of a game.
+
+    The hash XORs one key per feature: the level, the game and combat phases,
+    the area and the traps and treasures left in it, the turn order from the
+    current attacker on, and the position, hp and modifiers of every positioned
+    entity. The hp is exact, as the cached scores depend on it (eg: whether an
+    attack kills its target, or how much a heal restores). The hash is
+    recomputed from all features on every call, but the keys are memoized (up
+    to `max_keys`), so only the features that were not seen recently (eg: an
+    entity that just got hit) are digested.
+    """
+
+    def __init__(self, max_keys: int = configs.game.transpositions.max_keys):
+        self.max_keys = max_keys
+        self.keys: Dict[Tuple, int] = {}
+
+    def key(self, feature: Tuple) -> int:
+        key = self.keys.get(feature, None)
+        if key is None:
+            key = zobrist_key(feature)
+            if len(self.keys) >= self.max_keys:
+                # features of past states are rarely seen again
+                self.keys.clear()
+            self.keys[feature] = key
+        return key
+
+    def entity_key(self, entity: Union[Hero, Enemy], position: int) -> int:
+        modifiers = tuple(
+            (modifier.type, modifier.turns, modifier.amount)
+            for modifier in entity.modifiers
+        )
+        return self.key(("entity", position, entity.name, entity.hp, modifiers))
+
+    def hash(self, engine: GameEngine, turn_order: bool = True) -> int:
+        h = self.key(("level", engine.level_graph.fingerprint))
+        h ^= self.key(("state", engine.state))
+        h ^= self.key(
+            ("area", engine.scenario.current_room, engine.movement_engine.encounter_idx)
+        )
+        entities = engine.heroes.party.copy()
+        encounter = engine.current_encounter
+        if encounter is not None:
+            entities.extend(encounter.enemies)
+            h ^= self.key(("traps", tuple(trap.name for trap in encounter.traps)))
+            h ^= self.key(
+                ("treasures", tuple(treasure.name for treasure in encounter.treasures))
+            )
+        positions = {}
+        for position, entity in enumerate(entities):
+            positions[id(entity)] = position
+            h ^= self.entity_key(entity, position)
+        if engine.state == GameState.IN_COMBAT:
+            combat_engine = engine.combat_engine
+            h ^= self.key(("phase", combat_engine.state))
+            if not turn_order:
+                return h
+            to_play = combat_engine.initiative.remaining()
+            for i, entity in enumerate(to_play):
+                h ^= self.key(("turn", i, positions.get(id(entity), -1)))
+        return h
+
+
+class TranspositionTable:
+    """Bounded LRU cache of decision values, keyed by state hash.
+
+    Only deterministic values should be stored, as an entry is reused by every
+    later visit of the same state. Keys are `(kind, hash)` pairs and values
+    must be JSON serializable, so tables can be saved and loaded safely.
+    """
+
+    def __init__(self, max_size: int = configs.game.transpositions.max_size):
+        self.max_size = max_size
+        self.entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self.entries.get(key, None)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        # evict the least recently used entries
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
+
+    def save(self, filename: str) -> None:
+        with open(filename, "w") as f:
+            json.dump([[*key, value] for key, value in self.entries.items()], f)
+
+    @staticmethod
+    def load(
+        filename: str, max_size: int = configs.game.transpositions.max_size
+    ) -> "TranspositionTable":
+        """Load a saved table, or get an empty one if the file does not exist"""
+        table = TranspositionTable(max_size=max_size)
+        if os.path.exists(filename):
+            with open(filename, "r") as f:
+                for kind, h, value in json.load(f):
+                    table.put((kind, h), value)
+        return table
@@ -0,0 +1,169 @@
+from typing import List, Optional, Union
+
+from configs import configs
+from dungeon_despair.domain.entities.enemy import Enemy
+from dungeon_despair.domain.modifier import Modifier
+from dungeon_despair.domain.utils import ActionType, ModifierType
+from engine.modifier_flags import modifier_type
+from engine.game_engine import GameEngine
+from heroes_party import Hero
+
+
+class StressEvaluator:
+    """Expected stress change of the current attacker's actions, in closed form.
+
+    Follows the rules of `CombatEngine.process_attack` and `StressSystem`, including
+    the deaths caused by the action, without copying or ticking the engine. The
+    bleed and heal modifiers an action applies are included with their chance, as
+    the stress of all their ticks (and of the death they may cause), assuming
+    nothing else changes the target's hp in the meantime. Stuns and scares only
+    change the stress through later decisions and are not included.
+    """
+
+    def __init__(self, game_engine: GameEngine):
+        self.game_engine = game_engine
+
+    def expected_stress(self) -> List[Optional[float]]:
+        """Get the expected stress change of each action, None if it is not active"""
+        combat_engine = self.game_engine.combat_engine
+        return [
+            self.expected_action_stress(idx) if action.active else None
+            for idx, action in enumerate(combat_engine.actions)
+        ]
+
+    def expected_action_stress(self, idx: int) -> float:
+        combat_engine = self.game_engine.combat_engine
+        stress_system = self.game_engine.stress_system
+        heroes = self.game_engine.heroes
+        attacker = combat_engine.attacker
+        action = combat_engine.actions[idx]
+        action_type = combat_engine.targeting.get(action).action_type
+        is_hero = isinstance(attacker, Hero)
+        # heroes' stress changes are scaled by their resistance
+        resist_factor = 1 - stress_system.get_stress_resist(attacker) if is_hero else 1
+        positioned_entities = [*heroes.party, *combat_engine.current_encounter.enemies]
+
+        if action_type == ActionType.PASS:
+            if is_hero:
+                return int(configs.game.stress.passing * resist_factor)
+            return int(-configs.game.stress.passing)
+        elif action_type == ActionType.MOVE:
+            if self.best_move() is not None:
+                if is_hero:
+                    return int(configs.game.stress.switch_position * resist_factor)
+                return int(-configs.game.stress.switch_position)
+            # like the rollouts, not moving is scored just above passing
+            action_types = [
+                combat_engine.targeting.get(action).action_type
+                for action in combat_engine.actions
+            ]
+            return self.expected_action_stress(action_types.index(ActionType.PASS)) + 1
+        elif action_type == ActionType.DAMAGE:
+            stress = 0.0
+            for target_idx in combat_engine.targets_by_action[idx]:
+                target = positioned_entities[target_idx]
+                p_hit = min(1.0, max(0.0, action.accuracy - target.dodge))
+                hyp_dmg = int(action.base_dmg * (1 - target.prot))
+                sign = -resist_factor if is_hero else 1
+                stress += p_hit * int(hyp_dmg * sign)
+                stress += (1 - p_hit) * int(hyp_dmg / 2 * sign)
+                if target.hp - hyp_dmg <= 0:
+                    stress += p_hit * self.death_stress(target)
+                elif action.modifier is not None:
+                    stress += p_hit * self.expected_modifier_stress(
+                        target, action.modifier, target.hp - hyp_dmg
+                    )
+            return stress
+        else:
+            stress = 0.0
+            for target_idx in combat_engine.targets_by_action[idx]:
+                target = positioned_entities[target_idx]
+                heal = min(target.max_hp - target.hp, -action.base_dmg)
+                stress += int(-heal if isinstance(target, Hero) else heal)
+                if action.modifier is not None:
+                    stress += self.expected_modifier_stress(
+                        target, action.modifier, target.hp + heal
+                    )
+            return stress
+
+    @staticmethod
+    def death_stress(entity: Union[Hero, Enemy]) -> float:
+        if isinstance(entity, Hero):
+            return configs.game.stress.hero_dies
+        return configs.game.stress.enemy_dies
+
+    def expected_modifier_stress(
+        self, target: Union[Hero, Enemy], modifier: Modifier, hp: float
+    ) -> float:
+        """Get the expected stress of trying to add the modifier to the target"""
+        m_type = modifier_type(modifier)
+        stress = self.modifier_stress(
+            target, m_type, modifier.turns, modifier.amount, hp
+        )
+        # a modifier of the same type is refreshed, so its ticks are lost
+        for existing in target.modifiers:
+            if modifier_type(existing) == m_type:
+                stress -= self.modifier_stress(
+                    target, m_type, existing.turns, existing.amount, hp
+                )
+        return min(max(modifier.chance, 0.0), 1.0) * stress
+
+    def modifier_stress(
+        self,
+        target: Union[Hero, Enemy],
+        m_type: ModifierType,
+        turns: int,
+        amount: float,
+        hp: float,
+    ) -> float:
+        """Get the stress of the bleed or heal ticks of a modifier on the target"""
+        is_hero = isinstance(target, Hero)
+        stress = 0.0
+        if m_type == ModifierType.BLEED:
+            for _ in range(max(turns, 0)):
+                dmg = min(hp, amount)
+                hp -= dmg
+                stress += int(dmg if is_hero else -dmg)
+                if hp <= 0:
+                    return stress + self.death_stress(target)
+        elif m_type == ModifierType.HEAL:
+            for _ in range(max(turns, 0)):
+                heal = min(target.max_hp - hp, amount)
+                hp += heal
+                stress += int(-heal if is_hero else heal)
+        return stress
+
+    def best_move(self) -> Optional[int]:
+        """Get the position to move to that enables the most attacks, if any"""
+        combat_engine = self.game_engine.combat_engine
+        heroes = self.game_engine.heroes
+        attacker = combat_engine.attacker
+        is_hero = isinstance(attacker, Hero)
+        group = heroes.party if is_hero else combat_engine.current_encounter.enemies
+        offset = 0 if is_hero else len(heroes.party)
+        heroes_occupancy = (1 << len(heroes.party)) - 1
+        enemies_occupancy = (1 << len(combat_engine.current_encounter.enemies)) - 1
+
+        def n_attacks(position: int) -> int:
+            n = 0
+            for attack in attacker.attacks:
+                compiled = combat_engine.targeting.get(attack)
+                from_bits = compiled.from_heroes if is_hero else compiled.from_enemies
+                if (compiled.action_type == ActionType.DAMAGE) != is_hero:
+                    targeted = compiled.to_heroes & heroes_occupancy
+                else:
+                    targeted = compiled.to_enemies & enemies_occupancy
+                if (from_bits >> position) & 1 and targeted != 0:
+                    n += 1
+            return n
+
+        start = group.index(attacker)
+        best, best_n = None, n_attacks(start)
+        for target in range(len(group)):
+            # the attacker is inserted right before the target, see process_move
+            position = target - 1 if start < target else target
+            if position != start and group[target].name != attacker.name:
+                n = n_attacks(position)
+                if n > best_n:
+                    best, best_n = offset + target, n
+        return best
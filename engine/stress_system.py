@@ -1,113 +1,239 @@
-from typing import Union, List
+from enum import IntEnum
+from typing import Any, Dict, List, Tuple, Union
 
 from configs import configs
 from dungeon_despair.domain.entities.enemy import Enemy
 from dungeon_despair.domain.entities.hero import Hero
 from dungeon_despair.domain.entities.treasure import Treasure
-from dungeon_despair.domain.utils import ModifierType
+from engine.modifier_flags import ModifierFlagsTable
+
+
+class StressSource(IntEnum):
+    MOVEMENT = 0
+    TURN = 1
+    # combat sources are split by the side of the actor, or of the entity
+    # bleeding or healed, so their magnitudes stay positive
+    HEROES_HIT = 2
+    ENEMIES_HIT = 3
+    HEROES_MISS = 4
+    ENEMIES_MISS = 5
+    HEROES_BLEED = 6
+    ENEMIES_BLEED = 7
+    HEROES_HEALED = 8
+    ENEMIES_HEALED = 9
+    HEROES_PASS = 10
+    ENEMIES_PASS = 11
+    HEROES_SWITCH_POSITION = 12
+    ENEMIES_SWITCH_POSITION = 13
+    TRAP_DISARMED = 14
+    TRAP_TRIGGERED = 15
+    TRAP_DAMAGE = 16
+    TREASURE_LOOTED = 17
+    TREASURE_DISARMED = 18
+    TREASURE_TRIGGERED = 19
+    TREASURE_DAMAGE = 20
+    TREASURE_NOT_INSPECTED = 21
+    TRAPPED_TREASURE_NOT_INSPECTED = 22
+    IGNORE_TREASURE = 23
+    HERO_DIES = 24
+    ENEMY_DIES = 25
+    REGEN = 26
+    # stress resisted by the heroes, and the fractions dropped by rounding the
+    # stress of each event to an int
+    RESISTANCE = 27
+
+
+def compile_weights() -> List[float]:
+    """Get the stress of one unit of magnitude of each source"""
+    stress = configs.game.stress
+    weights = [0.0] * len(StressSource)
+    weights[StressSource.MOVEMENT] = stress.movement
+    weights[StressSource.TURN] = stress.turn
+    # damage and healing count 1 stress per hp, misses half the damage missed
+    weights[StressSource.HEROES_HIT] = -1.0
+    weights[StressSource.ENEMIES_HIT] = 1.0
+    weights[StressSource.HEROES_MISS] = -0.5
+    weights[StressSource.ENEMIES_MISS] = 0.5
+    weights[StressSource.HEROES_BLEED] = 1.0
+    weights[StressSource.ENEMIES_BLEED] = -1.0
+    weights[StressSource.HEROES_HEALED] = -1.0
+    weights[StressSource.ENEMIES_HEALED] = 1.0
+    weights[StressSource.HEROES_PASS] = stress.passing
+    weights[StressSource.ENEMIES_PASS] = -stress.passing
+    weights[StressSource.HEROES_SWITCH_POSITION] = stress.switch_position
+    weights[StressSource.ENEMIES_SWITCH_POSITION] = -stress.switch_position
+    weights[StressSource.TRAP_DISARMED] = stress.disarm_trap
+    weights[StressSource.TRAP_TRIGGERED] = stress.trigger_trap
+    weights[StressSource.TRAP_DAMAGE] = 1.0
+    weights[StressSource.TREASURE_LOOTED] = stress.loot_treasure
+    weights[StressSource.TREASURE_DISARMED] = stress.disarm_trap
+    weights[StressSource.TREASURE_TRIGGERED] = stress.trigger_trapped_treasure
+    weights[StressSource.TREASURE_DAMAGE] = 1.0
+    weights[StressSource.TREASURE_NOT_INSPECTED] = stress.no_inspect_treasure
+    weights[StressSource.TRAPPED_TREASURE_NOT_INSPECTED] = -stress.no_inspect_treasure
+    weights[StressSource.IGNORE_TREASURE] = stress.ignore_treasure
+    weights[StressSource.HERO_DIES] = stress.hero_dies
+    weights[StressSource.ENEMY_DIES] = stress.enemy_dies
+    # spending stress on regenerating entities lowers it by their cost
+    weights[StressSource.REGEN] = -1.0
+    weights[StressSource.RESISTANCE] = 1.0
+    return weights
 
 
 class StressSystem:
-    def __init__(self):
+    """Stress of a game, accounted by source.
+
+    For each source the number of events and their raw magnitude (hp dealt,
+    missed, bled or healed, stress spent, or one per event for the sources with
+    a fixed weight) are counted, and the stress is the dot product of the
+    magnitudes with the weights compiled from `configs.yml`. The stress of an
+    event is scaled by the hero's stress resistance and rounded to an int, the
+    difference is accounted as the magnitude of `StressSource.RESISTANCE`. The
+    total is kept up to date in `stress`, see `total` to compute it again.
+    """
+
+    def __init__(self, modifier_flags: ModifierFlagsTable):
         self.stress = 0
         self.score = 0
+        # read once, instead of on every event
+        self.weights = compile_weights()
+        self.counts = [0] * len(StressSource)
+        self.magnitudes = [0.0] * len(StressSource)
+        # for O(1) stress resistance checks
+        self.modifier_flags = modifier_flags
+
+    def add(
+        self, events: Tuple[Tuple[StressSource, float], ...], resist: float = 0.0
+    ) -> None:
+        """Account the sources and magnitudes of one event"""
+        stress_diff = 0.0
+        for source, magnitude in events:
+            self.counts[source] += 1
+            self.magnitudes[source] += magnitude
+            stress_diff += magnitude * self.weights[source]
+        rounded = int(stress_diff * (1 - resist))
+        if rounded != stress_diff:
+            self.counts[StressSource.RESISTANCE] += 1
+            self.magnitudes[StressSource.RESISTANCE] += rounded - stress_diff
+        self.stress += rounded
+
+    def total(self) -> float:
+        """Get the stress as the dot product of the magnitudes and the weights"""
+        return sum(m * w for m, w in zip(self.magnitudes, self.weights))
+
+    def breakdown(self) -> Dict[str, Dict[str, Any]]:
+        """Get the events, magnitude and stress of each source"""
+        return {
+            source.name.lower(): {
+                "count": self.counts[source],
+                "magnitude": self.magnitudes[source],
+                "stress": self.magnitudes[source] * self.weights[source],
+            }
+            for source in StressSource
+        }
+
+    def snapshot(self) -> Tuple:
+        return self.stress, self.score, self.counts.copy(), self.magnitudes.copy()
+
+    def restore(self, token: Tuple) -> None:
+        self.stress, self.score, counts, magnitudes = token
+        self.counts = counts.copy()
+        self.magnitudes = magnitudes.copy()
 
     def get_stress_resist(self, hero: Hero) -> float:
-        resist = hero.stress_resist
-        # check for 'scare' modifier
-        for modifier in hero.modifiers:
-            if modifier.type == ModifierType.SCARE:
-                resist -= modifier.amount
-        # no negative resist
-        resist = max(0.0, resist)
-        return resist
+        # net of the 'scare' modifiers, see ModifierFlags
+        return self.modifier_flags.get(hero).stress_resist
 
     def process_movement(self):
-        self.stress += configs.game.stress.movement
+        self.add(((StressSource.MOVEMENT, 1),))
 
     def process_dead(self, dead_entities: List[Union[Hero, Enemy]]):
         for entity in dead_entities:
             if isinstance(entity, Hero):
-                self.stress += configs.game.stress.hero_dies
+                self.add(((StressSource.HERO_DIES, 1),))
             else:
-                self.stress += configs.game.stress.enemy_dies
+                self.add(((StressSource.ENEMY_DIES, 1),))
 
     def process_new_turn(self):
-        self.stress += configs.game.stress.turn
+        self.add(((StressSource.TURN, 1),))
 
     def process_miss(self, hyp_dmg: float, attacker: Union[Hero, Enemy]):
-        stress_diff = hyp_dmg / 2
         if isinstance(attacker, Hero):
-            stress_diff *= -1
-            stress_diff *= 1 - self.get_stress_resist(attacker)
-        self.stress += int(stress_diff)
+            resist = self.get_stress_resist(attacker)
+            self.add(((StressSource.HEROES_MISS, hyp_dmg),), resist)
+        else:
+            self.add(((StressSource.ENEMIES_MISS, hyp_dmg),))
 
     def process_damage(self, dmg: float, attacker: Union[Hero, Enemy]):
-        stress_diff = dmg
         if isinstance(attacker, Hero):
-            stress_diff *= -1
-            stress_diff *= 1 - self.get_stress_resist(attacker)
-        self.stress += int(stress_diff)
+            resist = self.get_stress_resist(attacker)
+            self.add(((StressSource.HEROES_HIT, dmg),), resist)
+        else:
+            self.add(((StressSource.ENEMIES_HIT, dmg),))
 
     def process_bleed(self, dmg: float, entity: Union[Hero, Enemy]):
-        stress_diff = dmg
         if isinstance(entity, Enemy):
-            stress_diff *= -1
-        self.stress += int(stress_diff)
+            self.add(((StressSource.ENEMIES_BLEED, dmg),))
+        else:
+            self.add(((StressSource.HEROES_BLEED, dmg),))
 
     def process_heal(self, heal: float, entity: Union[Hero, Enemy]):
-        stress_diff = heal
         if isinstance(entity, Hero):
-            stress_diff *= -1
-        self.stress += int(stress_diff)
+            self.add(((StressSource.HEROES_HEALED, heal),))
+        else:
+            self.add(((StressSource.ENEMIES_HEALED, heal),))
 
     def process_pass(self, attacker: Union[Hero, Enemy]):
-        stress_diff = configs.game.stress.passing
         if isinstance(attacker, Hero):
-            stress_diff *= 1 - self.get_stress_resist(attacker)
+            resist = self.get_stress_resist(attacker)
+            self.add(((StressSource.HEROES_PASS, 1),), resist)
         else:
-            stress_diff *= -1
-        self.stress += int(stress_diff)
+            self.add(((StressSource.ENEMIES_PASS, 1),))
 
     def process_move(self, attacker: Union[Hero, Enemy]):
-        stress_diff = configs.game.stress.switch_position
         if isinstance(attacker, Hero):
-            stress_diff *= 1 - self.get_stress_resist(attacker)
+            resist = self.get_stress_resist(attacker)
+            self.add(((StressSource.HEROES_SWITCH_POSITION, 1),), resist)
         else:
-            stress_diff *= -1
-        self.stress += int(stress_diff)
+            self.add(((StressSource.ENEMIES_SWITCH_POSITION, 1),))
 
     def process_disarmed_treasure(self, inspected: bool):
-        stress_diff = (
-            configs.game.stress.loot_treasure + configs.game.stress.disarm_trap
+        events = (
+            (StressSource.TREASURE_LOOTED, 1),
+            (StressSource.TREASURE_DISARMED, 1),
         )
-        stress_diff += configs.game.stress.no_inspect_treasure if not inspected else 0
-        self.stress += int(stress_diff)
+        if not inspected:
+            events += ((StressSource.TREASURE_NOT_INSPECTED, 1),)
+        self.add(events)
 
     def process_triggered_treasure(self, hero: Hero, dmg_dealt: float, inspected: bool):
-        stress_diff = configs.game.stress.trigger_trapped_treasure + dmg_dealt
-        stress_diff -= configs.game.stress.no_inspect_treasure if not inspected else 0
-        stress_diff *= 1 - self.get_stress_resist(hero)
-        self.stress += int(stress_diff)
+        events = (
+            (StressSource.TREASURE_TRIGGERED, 1),
+            (StressSource.TREASURE_DAMAGE, dmg_dealt),
+        )
+        if not inspected:
+            events += ((StressSource.TRAPPED_TREASURE_NOT_INSPECTED, 1),)
+        self.add(events, self.get_stress_resist(hero))
 
     def process_safe_treasure(self, inspected: bool):
-        stress_diff = configs.game.stress.loot_treasure
-        stress_diff += configs.game.stress.no_inspect_treasure if not inspected else 0
-        self.stress += int(stress_diff)
+        events = ((StressSource.TREASURE_LOOTED, 1),)
+        if not inspected:
+            events += ((StressSource.TREASURE_NOT_INSPECTED, 1),)
+        self.add(events)
 
     def process_ignore_looting(self, treasure: Treasure, hero: Hero):
-        stress_diff = configs.game.stress.ignore_treasure
-        stress_diff *= 1 - self.get_stress_resist(hero)
-        self.stress += int(stress_diff)
+        resist = self.get_stress_resist(hero)
+        self.add(((StressSource.IGNORE_TREASURE, 1),), resist)
 
     def process_trap(self, hero: Hero, dmg_dealt: float, disarmed: bool):
         if disarmed:
-            stress_diff = configs.game.stress.disarm_trap
+            self.add(((StressSource.TRAP_DISARMED, 1),))
         else:
-            stress_diff = configs.game.stress.trigger_trap
-            stress_diff += dmg_dealt
-            stress_diff *= 1 - self.get_stress_resist(hero)
-        self.stress += int(stress_diff)
-
-
-stress_system = StressSystem()
+            events = (
+                (StressSource.TRAP_TRIGGERED, 1),
+                (StressSource.TRAP_DAMAGE, dmg_dealt),
+            )
+            self.add(events, self.get_stress_resist(hero))
+
+    def process_regen(self, cost: float):
+        self.add(((StressSource.REGEN, cost),))
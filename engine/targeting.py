@@ -0,0 +1,69 @@
+from typing import Dict, List, Tuple, Union
+
+from dungeon_despair.domain.attack import Attack
+from dungeon_despair.domain.entities.enemy import Enemy
+from dungeon_despair.domain.level import Level
+from dungeon_despair.domain.utils import ActionType, get_enum_by_value
+from heroes_party import Hero
+
+# indices of the set bits of every mask, for formations of up to 8 entities
+_BIT_INDICES: List[Tuple[int, ...]] = [
+    tuple(i for i in range(8) if (bits >> i) & 1) for bits in range(1 << 8)
+]
+
+
+def bit_indices(bits: int) -> Tuple[int, ...]:
+    """Get the indices of the set bits of a mask, in increasing order"""
+    if bits < len(_BIT_INDICES):
+        return _BIT_INDICES[bits]
+    return tuple(i for i in range(bits.bit_length()) if (bits >> i) & 1)
+
+
+def mask_to_bits(mask: str, reverse: bool = False) -> int:
+    """Convert a positions mask (eg: "XXOX") to a bitmask of the marked positions"""
+    bits = 0
+    for i, x in enumerate(mask):
+        if x == "X":
+            bits |= 1 << (len(mask) - 1 - i if reverse else i)
+    return bits
+
+
+class CompiledAttack:
+    def __init__(self, attack: Attack):
+        self.attack = attack
+        self.action_type = get_enum_by_value(ActionType, attack.type)
+        # FROM is reversed for heroes
+        self.from_heroes = mask_to_bits(attack.starting_positions, reverse=True)
+        self.from_enemies = mask_to_bits(attack.starting_positions)
+        # TO is reversed when targeting heroes
+        self.to_heroes = mask_to_bits(attack.target_positions, reverse=True)
+        self.to_enemies = mask_to_bits(attack.target_positions)
+
+
+class TargetingTable:
+    def __init__(self):
+        self.compiled: Dict[int, CompiledAttack] = {}
+
+    def get(self, attack: Attack) -> CompiledAttack:
+        """Get the compiled attack, compiling it if it has not been seen before"""
+        compiled = self.compiled.get(id(attack), None)
+        if compiled is None or compiled.attack is not attack:
+            compiled = CompiledAttack(attack)
+            self.compiled[id(attack)] = compiled
+        return compiled
+
+    def compile(self, attacks: List[Attack]) -> None:
+        for attack in attacks:
+            self.get(attack)
+
+    def compile_entities(self, entities: List[Union[Hero, Enemy]]) -> None:
+        for entity in entities:
+            self.compile(entity.attacks)
+
+    def compile_level(self, level: Level) -> None:
+        """Compile the attacks of all enemies in the level"""
+        for room in level.rooms.values():
+            self.compile_entities(room.encounter.enemies)
+        for corridor in level.corridors.values():
+            for encounter in corridor.encounters:
+                self.compile_entities(encounter.enemies)
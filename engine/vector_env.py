@@ -0,0 +1,171 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from engine.env import MASK_OFFSET, N_ACTIONS, OBS_SIZE, GameEnv
+
+# builds an environment writing its observations in the given buffer
+EnvFn = Callable[..., GameEnv]
+
+
+class EnvShard:
+    """Environments stepped together in one process, reset as soon as they end"""
+
+    def __init__(
+        self,
+        env_fns: List[EnvFn],
+        obs: np.ndarray,
+        first_idx: int,
+        seed: Optional[int],
+    ):
+        self.envs = [env_fn(obs=obs[i]) for i, env_fn in enumerate(env_fns)]
+        self.first_idx = first_idx
+        self.seed = seed
+        self.episodes = [0] * len(self.envs)
+        self.rewards = np.zeros(len(self.envs), dtype=np.float32)
+        self.dones = np.zeros(len(self.envs), dtype=bool)
+
+    def episode_seed(self, i: int) -> Optional[int]:
+        """Get the seed of the current episode of an environment"""
+        if self.seed is None:
+            return None
+        seed_seq = np.random.SeedSequence(
+            [self.seed, self.first_idx + i, self.episodes[i]]
+        )
+        return int(seed_seq.generate_state(1)[0])
+
+    def reset(self) -> None:
+        for i, env in enumerate(self.envs):
+            env.reset(seed=self.episode_seed(i))
+
+    def step(self, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        for i, env in enumerate(self.envs):
+            _, reward, terminated, truncated, _ = env.step(int(actions[i]))
+            self.rewards[i] = reward
+            self.dones[i] = terminated or truncated
+            if self.dones[i]:
+                self.episodes[i] += 1
+                env.reset(seed=self.episode_seed(i))
+        return self.rewards, self.dones
+
+
+def _shard_worker(
+    conn: Connection,
+    env_fns: List[EnvFn],
+    shm_name: str,
+    n_envs: int,
+    first_idx: int,
+    seed: Optional[int],
+) -> None:
+    shm = shared_memory.SharedMemory(name=shm_name)
+    obs = np.ndarray((n_envs, OBS_SIZE), dtype=np.float32, buffer=shm.buf)
+    shard = EnvShard(
+        env_fns, obs[first_idx : first_idx + len(env_fns)], first_idx, seed
+    )
+    try:
+        while True:
+            cmd, data = conn.recv()
+            if cmd == "reset":
+                shard.reset()
+                conn.send(None)
+            elif cmd == "step":
+                conn.send(shard.step(data))
+            else:
+                break
+    finally:
+        del shard, obs
+        shm.close()
+        conn.close()
+
+
+class VectorEnv:
+    """N environments stepped in lockstep, either in process or in worker processes.
+
+    Observations are stacked in a single (N, OBS_SIZE) array that the
+    environments write into directly; with workers the array lives in shared
+    memory, so only actions, rewards and dones go through the pipes. Finished
+    environments are reset right away: their done flag is set and their
+    observation is the first one of the next episode.
+    """
+
+    def __init__(
+        self,
+        env_fns: List[EnvFn],
+        n_workers: int = 0,
+        seed: Optional[int] = None,
+    ):
+        self.n_envs = len(env_fns)
+        self.shm: Optional[shared_memory.SharedMemory] = None
+        self.shards: List[EnvShard] = []
+        self.workers: List[Tuple[mp.Process, Connection, slice]] = []
+        if n_workers == 0:
+            self.obs = np.zeros((self.n_envs, OBS_SIZE), dtype=np.float32)
+            self.shards.append(EnvShard(env_fns, self.obs, 0, seed))
+        else:
+            self.shm = shared_memory.SharedMemory(
+                create=True, size=self.n_envs * OBS_SIZE * 4
+            )
+            self.obs = np.ndarray(
+                (self.n_envs, OBS_SIZE), dtype=np.float32, buffer=self.shm.buf
+            )
+            for idxs in np.array_split(np.arange(self.n_envs), n_workers):
+                if len(idxs) == 0:
+                    continue
+                shard = slice(int(idxs[0]), int(idxs[-1]) + 1)
+                conn, worker_conn = mp.Pipe()
+                process = mp.Process(
+                    target=_shard_worker,
+                    args=(
+                        worker_conn,
+                        env_fns[shard],
+                        self.shm.name,
+                        self.n_envs,
+                        shard.start,
+                        seed,
+                    ),
+                    daemon=True,
+                )
+                process.start()
+                worker_conn.close()
+                self.workers.append((process, conn, shard))
+        self.action_masks = self.obs[:, MASK_OFFSET : MASK_OFFSET + N_ACTIONS]
+        self.rewards = np.zeros(self.n_envs, dtype=np.float32)
+        self.dones = np.zeros(self.n_envs, dtype=bool)
+
+    def reset(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Reset all environments, get the observations and the action masks"""
+        for shard in self.shards:
+            shard.reset()
+        for _, conn, _ in self.workers:
+            conn.send(("reset", None))
+        for _, conn, _ in self.workers:
+            conn.recv()
+        return self.obs, self.action_masks
+
+    def step(
+        self, actions: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Step all environments, get the observations, rewards, dones and masks"""
+        for shard in self.shards:
+            self.rewards[:], self.dones[:] = shard.step(actions)
+        # all workers step at the same time
+        for _, conn, shard in self.workers:
+            conn.send(("step", actions[shard]))
+        for _, conn, shard in self.workers:
+            self.rewards[shard], self.dones[shard] = conn.recv()
+        return self.obs, self.rewards, self.dones, self.action_masks
+
+    def close(self) -> None:
+        for process, conn, _ in self.workers:
+            conn.send(("close", None))
+            process.join()
+            conn.close()
+        self.workers = []
+        if self.shm is not None:
+            del self.obs, self.action_masks
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
@@ -15,9 +15,7 @@ from dungeon_despair.domain.utils import ActionType, get_enum_by_value
 from engine.actions_engine import LootingChoice
 from engine.combat_engine import CombatPhase
 from engine.game_engine import GameEngine, GameState
-from engine.message_system import msg_system
 from engine.movement_engine import Destination
-from engine.stress_system import stress_system
 from player.ai_player import AIPlayer
 from player.base_player import PlayerType
 from player.human_player import HumanPlayer
@@ -283,7 +281,9 @@ def update_ui_elements():
         )
     encounter_preview.display_heroes(game_engine.heroes)
     encounter_preview.display_encounter(game_engine.current_encounter)
-    encounter_preview.display_stats_level(stress_system.stress, game_engine.wave)
+    encounter_preview.display_stats_level(
+        game_engine.stress_system.stress, game_engine.wave
+    )
     encounter_preview.update_modifiers(
         heroes=game_engine.heroes, enemies=game_engine.current_encounter.enemies
     )
@@ -416,6 +416,7 @@ while running:
                     dest = heroes_player.pick_destination(
                         destinations=game_engine.movement_engine.destinations,
                         unk_areas=game_engine.movement_engine.unk_areas,
+                        game_engine=game_engine,
                     )
                 if dest is not None:
                     game_engine.move_to(dest=dest)
@@ -434,7 +435,9 @@ while running:
                         if event_in_ui_element(event, action_window):
                             idx = action_window.check_colliding_action(pos=event.pos)
                 else:
-                    idx = game_engine.player.choose_disarm_trap()
+                    idx = game_engine.player.choose_disarm_trap(
+                        game_engine=game_engine
+                    )
                 if idx is not None:
                     game_engine.process_disarm()
                     game_engine.tick()
@@ -449,7 +452,7 @@ while running:
                                 choice = treasure_choices[idx].looting_choice
                 else:
                     choice = game_engine.player.choose_loot_treasure(
-                        **{"game_engine_copy": copy.deepcopy(game_engine)}
+                        **{"game_engine": game_engine}
                     )
                 if choice is not None:
                     game_engine.process_looting(choice=choice)
@@ -479,7 +482,7 @@ while running:
                         action_idx = game_engine.player.pick_actions(
                             **{
                                 "actions": game_engine.actions,
-                                "game_engine_copy": copy.deepcopy(game_engine),
+                                "game_engine": game_engine,
                             }
                         )
                     if action_idx is not None:
@@ -536,7 +539,7 @@ while running:
                             **{
                                 "n_heroes": len(game_engine.heroes.party),
                                 "n_enemies": len(game_engine.current_encounter.enemies),
-                                "game_engine_copy": copy.deepcopy(game_engine),
+                                "game_engine": game_engine,
                             }
                         )
                         if sprite_idx is None:
@@ -558,13 +561,15 @@ while running:
                         update_ui_elements()
             elif game_engine.state == GameState.WAVE_OVER:
                 game_engine.wave += 1
-                stress_system.score += stress_system.stress
+                game_engine.stress_system.score += game_engine.stress_system.stress
                 diff_entities, locations = get_entities_differences(
                     ref_level=level_copy, curr_level=game_engine.scenario
                 )
                 if len(diff_entities) > 0:
-                    if stress_system.stress < min([x.cost for x in diff_entities]):
-                        msg_system.add_msg(
+                    if game_engine.stress_system.stress < min(
+                        [x.cost for x in diff_entities]
+                    ):
+                        game_engine.msg_system.add_msg(
                             f"Not enough stress points! The dungeon will remain as is..."
                         )
                         game_engine.restart_level_from_room(
@@ -586,13 +591,13 @@ while running:
                         regen_picker.show()
                         game_engine.state = GameState.REGENERATING
                 else:
-                    msg_system.add_msg(f"The dungeon lives on!")
+                    game_engine.msg_system.add_msg(f"The dungeon lives on!")
                     game_engine.restart_level_from_room(
                         room_name=level_copy.current_room
                     )
                     game_engine.state = GameState.NEXT_WAVE
             elif game_engine.state == GameState.NEXT_WAVE:
-                msg_system.add_msg(f"<b>## Starting a new wave...</b>")
+                game_engine.msg_system.add_msg(f"<b>## Starting a new wave...</b>")
                 roster_window = HeroRosterWindow(
                     rect=pygame.Rect(
                         configs.ui.screen_width / 4,
@@ -604,8 +609,8 @@ while running:
                 )
                 roster_initialized = False
                 appstate = AppState.GENERATING_HEROES
-        for msg in msg_system.get_queue():
-            events_history.add_text_and_scroll(msg)
+        for event in game_engine.msg_system.get_events():
+            events_history.add_event_and_scroll(event)
     ui_manager.update(time_delta)
     if appstate == AppState.IN_GAME:
         screen.fill("#121212")
@@ -613,7 +618,7 @@ while running:
         if game_over_window.background_image is None:
             encounter_preview.stats_level.kill()
             action_window.clear_actions()
-            game_over_window.toggle()
+            game_over_window.toggle(score=game_engine.stress_system.score)
     ui_manager.draw_ui(screen)
     pygame.display.update()
 pygame.quit()
@@ -1,25 +1,88 @@
 import copy
-from typing import List, Optional, Dict
+from concurrent.futures import Executor
+from typing import Any, Callable, List, Optional, Dict
 
+from dungeon_despair.domain.attack import Attack
 from dungeon_despair.domain.utils import ActionType
 import numpy as np
 
 from dungeon_despair.domain.entities.hero import Hero
 from engine.actions_engine import LootingChoice
 from engine.game_engine import GameEngine
-from engine.message_system import msg_system
 from engine.movement_engine import Destination
-from engine.stress_system import stress_system
+from engine.route_planner import RoutePlanner
+from engine.state_hash import StateHasher, TranspositionTable
+from engine.stress_evaluator import StressEvaluator
 from player.base_player import Player, PlayerType
 from configs import configs
 
 
+def loot_rollouts(game_engine: GameEngine, seeds: List[int]) -> List[List[float]]:
+    """Play every looting choice out once per seed, get the stress changes"""
+    prev_stress = game_engine.stress_system.stress
+    token = game_engine.snapshot()
+    stress_diffs = []
+    with game_engine.msg_system.mute():
+        for seed in seeds:
+            seed_diffs = []
+            for looting_choice in LootingChoice:
+                # common random numbers: every choice sees the same draws
+                game_engine.rng.reseed(seed)
+                game_engine.process_looting(choice=looting_choice)
+                game_engine.tick()
+                seed_diffs.append(game_engine.stress_system.stress - prev_stress)
+                game_engine.restore(token)
+            stress_diffs.append(seed_diffs)
+    return stress_diffs
+
+
 class AIPlayer(Player):
-    def __init__(self):
+    def __init__(
+        self,
+        backend: str = "rollout",
+        executor: Optional[Executor] = None,
+        loot_samples: int = configs.game.sim_depth,
+        loot_chunks: int = 4,
+        transpositions: Optional[TranspositionTable] = None,
+    ):
         super().__init__(PlayerType.AI)
+        # "rollout" plays each action out, "analytic" computes its expected stress
+        if backend not in ["rollout", "analytic"]:
+            raise NotImplementedError(f"{backend} is not implemented yet!")
+        self.backend = backend
+        # optional, spreads the looting rollouts over `loot_chunks` tasks
+        self.executor = executor
+        self.loot_samples = loot_samples
+        self.loot_chunks = loot_chunks
+        # optional, deterministic scores already computed in the same state are
+        # reused; sampled rollouts are always played again
+        self.transpositions = transpositions
+        self.hasher = StateHasher() if transpositions is not None else None
         self.visited_areas: Dict[str, int] = {}
-        self.game_engine_copy: Optional[GameEngine] = None
         self.__current_area: Optional[Destination] = None
+        # route over the level, planned once per level
+        self.planner: Optional[RoutePlanner] = None
+
+    def __getstate__(self):
+        # executors cannot be pickled, copies of the player play serially
+        state = self.__dict__.copy()
+        state["executor"] = None
+        return state
+
+    def cached(self, kind: str, game_engine: GameEngine, fn: Callable) -> Any:
+        """Get the result of `fn` from the transposition table, or compute it.
+
+        `fn` must be deterministic in the hashed state, eg: analytic scores.
+        """
+        if self.transpositions is None:
+            return fn()
+        key = (kind, self.hasher.hash(game_engine))
+        # results are wrapped, as None is a valid result
+        entry = self.transpositions.get(key)
+        if entry is None:
+            entry = (fn(),)
+            self.transpositions.put(key, entry)
+        return entry[0]
 
     def update_visited_areas(self, dest: Destination) -> None:
         k = str(dest)
@@ -31,23 +94,33 @@ class AIPlayer(Player):
     def pick_destination(self, **kwargs) -> Destination:
         destinations: List[Destination] = kwargs["destinations"]
         areas_count = kwargs["unk_areas"]
+        game_engine: Optional[GameEngine] = kwargs.get("game_engine", None)
+
+        if game_engine is not None:
+            if (
+                self.planner is None
+                or self.planner.level_graph is not game_engine.level_graph
+            ):
+                self.planner = RoutePlanner(game_engine.level_graph)
+            next_destination = self.planner.next_destination(game_engine)
+            if next_destination is not None:
+                self.__current_area = next_destination
+                self.update_visited_areas(next_destination)
+                return next_destination
 
-        print(f"\n\n\tDestinations: {[(d.to, d.idx) for d in destinations]}")
-        print(f"\tAreas count: {areas_count}")
-        # Filter out destinations that have already been explored
+        # Greedy choice, when there is no route to follow:
+        # filter out destinations that have already been explored
         unexplored_destinations = [
             destination
             for destination in destinations
             if self.visited_areas.get(str(destination), 0) == 0
         ]
-        print(f"\t\tUnexplored: {[(d.to, d.idx) for d in unexplored_destinations]}")
 
         viable_destinations = [
             dest
             for dest in unexplored_destinations
             if areas_count[str(dest)] > 1 or str(dest) != str(self.__current_area)
         ]
-        print(f"\tViable: {[(d.to, d.idx) for d in viable_destinations]}")
 
         if viable_destinations:
             next_destination = max(
@@ -55,8 +128,6 @@ class AIPlayer(Player):
             )
             self.__current_area = next_destination
             self.update_visited_areas(next_destination)
-
-            print(f"\t->Picked: {[next_destination.to, next_destination.idx]}")
             return next_destination
 
         if len(unexplored_destinations) == 0 and len(viable_destinations) == 0:
@@ -69,97 +140,134 @@ class AIPlayer(Player):
             areas_count[str(dest)] + self.visited_areas.get(str(dest), 0)
             for dest in destinations
         ]
-        print(f"\tdest_count: {dest_count}")
 
         next_destination = destinations[np.argmin(dest_count)]
         self.__current_area = next_destination
         self.update_visited_areas(next_destination)
 
-        print(f"\t->Picked: {[next_destination.to, next_destination.idx]}")
-
         return next_destination
 
     def pick_actions(self, **kwargs) -> int:
-        self.game_engine_copy = kwargs["game_engine_copy"]
-        actions = kwargs["actions"]
-        prev_stress = stress_system.stress
-        curr_msg_queue = msg_system.get_queue()
-        stress_diffs = []
-        attacker, _ = self.game_engine_copy.attacker_and_idx
-        for i, action in enumerate(actions):
-            eng_copy = copy.deepcopy(self.game_engine_copy)
-            # only evaluate active actions
-            if action.active:  # pass has 10 stress, move has 0, both are active
-                eng_copy.process_attack(i)
-                eng_copy.tick()
-                stress_diff = stress_system.stress - prev_stress
-                stress_system.stress -= stress_diff  # reset stress to before simulation
-                # if action is a move, continue the simulation
-                if action.type == ActionType.MOVE.value:
-                    curr_eng_copy = copy.deepcopy(eng_copy)
-                    idx = self.pick_moving(
-                        **{
-                            "n_heroes": len(eng_copy.heroes.party),
-                            "n_enemies": len(eng_copy.current_encounter.enemies),
-                            "game_engine_copy": eng_copy,
-                        }
-                    )
-                    eng_copy = curr_eng_copy
-                    self.game_engine_copy = kwargs["game_engine_copy"]
-                    del curr_eng_copy
-                    if idx is not None:
-                        eng_copy.process_move(idx)
-                        stress_diff = stress_system.stress - prev_stress
-                        stress_system.stress -= stress_diff
-                    else:  # cannot move to a better position
-                        # setting it here because it's 0 in the stress system
-                        # set it to whatever the stress from passing was, + 1
-                        stress_diff = stress_diffs[-1] + 1
-            else:
-                stress_diff = 999999
-            stress_diff *= (
-                1 if isinstance(attacker, Hero) else -1
-            )  # heroes want to minimize their stress
-            stress_diffs.append(stress_diff)
-            del eng_copy
-        del self.game_engine_copy
-        msg_system.queue = curr_msg_queue  # reset messages queue to before simulation
+        game_engine: GameEngine = kwargs["game_engine"]
+        if self.backend == "analytic":
+            stress_diffs = self.cached(
+                "actions_analytic",
+                game_engine,
+                lambda: self.score_actions_analytic(game_engine),
+            )
+        else:
+            # rollouts sample the game's streams, a single sample is not reused
+            stress_diffs = self.score_actions_rollout(game_engine, kwargs["actions"])
         return stress_diffs.index(min(stress_diffs))
 
+    def score_actions_analytic(self, game_engine: GameEngine) -> List[float]:
+        """Score the actions by their expected stress change, lower is better"""
+        attacker, _ = game_engine.attacker_and_idx
+        # heroes want to minimize their stress
+        sign = 1 if isinstance(attacker, Hero) else -1
+        return [
+            sign * stress_diff if stress_diff is not None else 999999
+            for stress_diff in StressEvaluator(game_engine).expected_stress()
+        ]
+
+    def score_actions_rollout(
+        self, game_engine: GameEngine, actions: List[Attack]
+    ) -> List[float]:
+        """Score the actions by playing each one out, lower is better"""
+        prev_stress = game_engine.stress_system.stress
+        # every rollout starts from and is rolled back to the current state
+        token = game_engine.snapshot()
+        stress_diffs = []
+        attacker, _ = game_engine.attacker_and_idx
+        with game_engine.msg_system.mute():
+            for i, action in enumerate(actions):
+                # only evaluate active actions
+                # pass has 10 stress, move has 0, both are active
+                if action.active:
+                    game_engine.process_attack(i)
+                    game_engine.tick()
+                    stress_diff = game_engine.stress_system.stress - prev_stress
+                    # if action is a move, continue the simulation
+                    action_type = game_engine.targeting.get(action).action_type
+                    if action_type == ActionType.MOVE:
+                        idx = self.pick_moving(
+                            **{
+                                "n_heroes": len(game_engine.heroes.party),
+                                "n_enemies": len(
+                                    game_engine.current_encounter.enemies
+                                ),
+                                "game_engine": game_engine,
+                            }
+                        )
+                        if idx is not None:
+                            game_engine.process_move(idx)
+                            stress_diff = (
+                                game_engine.stress_system.stress - prev_stress
+                            )
+                        else:  # cannot move to a better position
+                            # setting it here because it's 0 in the stress system
+                            # set it to whatever the stress from passing was, + 1
+                            stress_diff = stress_diffs[-1] + 1
+                    game_engine.restore(token)
+                else:
+                    stress_diff = 999999
+                stress_diff *= (
+                    1 if isinstance(attacker, Hero) else -1
+                )  # heroes want to minimize their stress
+                stress_diffs.append(stress_diff)
+        return stress_diffs
+
     def pick_moving(self, **kwargs) -> Optional[int]:
         n_heroes = kwargs["n_heroes"]
         n_enemies = kwargs["n_enemies"]
-        self.game_engine_copy = kwargs["game_engine_copy"]
-        curr_msg_queue = msg_system.get_queue()
+        game_engine: GameEngine = kwargs["game_engine"]
+        if self.backend == "analytic":
+            return self.cached(
+                "move_analytic",
+                game_engine,
+                lambda: StressEvaluator(game_engine).best_move(),
+            )
+        # not cached, like the rollout scores of the actions
+        return self.best_move_rollout(game_engine, n_heroes, n_enemies)
+
+    def best_move_rollout(
+        self, game_engine: GameEngine, n_heroes: int, n_enemies: int
+    ) -> Optional[int]:
+        """Find the position that enables the most attacks by trying each one"""
+        token = game_engine.snapshot()
         # move to maximize number of possible attacks
         n_attacks = sum(
-            [1 if x.active else 0 for x in self.game_engine_copy.combat_engine.actions]
+            [1 if x.active else 0 for x in game_engine.combat_engine.actions]
         )
-        curr_idx = self.game_engine_copy.attacker_and_idx[1]
+        start_idx = game_engine.attacker_and_idx[1]
+        curr_idx = start_idx
         idxs_range = (
             range(0, n_heroes)
             if curr_idx < n_heroes
             else range(n_heroes, n_heroes + n_enemies)
         )
-        for i, idx in enumerate(idxs_range):
-            if idx != curr_idx:
-                eng_copy = copy.deepcopy(self.game_engine_copy)
-                eng_copy.process_move(idx=idx)
-                eng_copy.tick()
-                new_n_attacks = sum(
-                    [
-                        1 if x.active else 0
-                        for x in self.game_engine_copy.combat_engine.actions
-                    ]
-                )
-                if new_n_attacks > n_attacks:
-                    curr_idx = idx
-                    n_attacks = new_n_attacks
+        with game_engine.msg_system.mute():
+            for i, idx in enumerate(idxs_range):
+                if idx != curr_idx:
+                    game_engine.process_move(idx=idx)
+                    # count the mover's attacks from its new position, ticking
+                    # would move on to the next attacker
+                    game_engine.combat_engine.set_actions_and_targets(
+                        heroes=game_engine.heroes
+                    )
+                    new_n_attacks = sum(
+                        [
+                            1 if x.active else 0
+                            for x in game_engine.combat_engine.actions
+                        ]
+                    )
+                    game_engine.restore(token)
+                    if new_n_attacks > n_attacks:
+                        curr_idx = idx
+                        n_attacks = new_n_attacks
         # if no movement increases number of possible attacks, cancel the move
-        if curr_idx == self.game_engine_copy.attacker_and_idx[1]:
+        if curr_idx == start_idx:
             curr_idx = None
-        del self.game_engine_copy
-        msg_system.queue = curr_msg_queue  # reset messages queue to before simulation
         return curr_idx
 
     def choose_disarm_trap(self, **kwargs) -> bool:
@@ -167,20 +275,27 @@ class AIPlayer(Player):
         return True
 
     def choose_loot_treasure(self, **kwargs) -> LootingChoice:
-        self.game_engine_copy = kwargs["game_engine_copy"]
-        prev_stress = stress_system.stress
-        curr_msg_queue = msg_system.get_queue()
-        stress_diffs = []
-        for looting_choice in LootingChoice:
-            avg_stress_diffs = []
-            # Multiple attempts for more informed choice
-            for _ in range(configs.game.sim_depth):
-                eng_copy = copy.deepcopy(self.game_engine_copy)
-                eng_copy.process_looting(choice=looting_choice)
-                eng_copy.tick()
-                stress_diff = stress_system.stress - prev_stress
-                stress_system.stress -= stress_diff  # reset stress to before simulation
-                avg_stress_diffs.append(stress_diff)
-            stress_diffs.append(np.mean(avg_stress_diffs))
-        msg_system.queue = curr_msg_queue  # reset messages queue to before simulation
+        # sampled, and drawing the samples' seeds must not depend on a cache
+        return self.best_looting_choice(kwargs["game_engine"])
+
+    def best_looting_choice(self, game_engine: GameEngine) -> LootingChoice:
+        """Find the looting choice with the lowest mean stress change"""
+        # Multiple attempts for more informed choice, seeded by the players' stream
+        rng = game_engine.rng.policy
+        seeds = [rng.getrandbits(32) for _ in range(self.loot_samples)]
+        # instrumented engines cannot be sent to other processes
+        if self.executor is not None and game_engine.profiler is None:
+            # the players are not needed to play the treasure out
+            payload = copy.copy(game_engine)
+            payload.heroes_player, payload.enemies_player = None, None
+            chunk_size = -(-len(seeds) // self.loot_chunks)
+            futures = [
+                self.executor.submit(loot_rollouts, payload, seeds[i : i + chunk_size])
+                for i in range(0, len(seeds), chunk_size)
+            ]
+            samples = [diffs for future in futures for diffs in future.result()]
+        else:
+            # the game's streams are rolled back with the rest of the state
+            samples = loot_rollouts(game_engine, seeds)
+        stress_diffs = np.mean(samples, axis=0).tolist()
         return list(LootingChoice)[stress_diffs.index(min(stress_diffs))]
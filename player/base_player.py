@@ -9,6 +9,7 @@ class PlayerType(Enum):
     RANDOM: int = auto()
     LLM: int = auto()
     AI: int = auto()
+    MCTS: int = auto()
 
 
 class Player:
@@ -0,0 +1,192 @@
+import math
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from configs import configs
+from engine.actions_engine import LootingChoice
+from engine.decision import (
+    DecisionKind,
+    apply_decision,
+    current_decision,
+    decider_is_hero,
+    decision_context,
+    destination_encounters,
+    legal_options,
+    option_key,
+)
+from engine.game_engine import GameEngine, GameState
+from engine.movement_engine import Destination
+from player.base_player import Player, PlayerType
+
+
+class MCTSNode:
+    def __init__(self):
+        self.children: Dict[Tuple[DecisionKind, Hashable], "MCTSNode"] = {}
+        self.visits = 0
+        # sum of the stress at the end of the simulations through this node
+        self.total_stress = 0.0
+        # the last game position in which this node's decision was taken
+        self.context: Optional[Tuple] = None
+
+    @property
+    def mean_stress(self) -> float:
+        return self.total_stress / self.visits
+
+
+class MCTSPlayer(Player):
+    """Open-loop Monte Carlo tree search over the decisions of the game.
+
+    Each simulation restores the game and replays the decisions from the root, so
+    chance outcomes are sampled anew every time. Heroes minimize the stress and
+    enemies maximize it. The search stops when the party would leave the area (or
+    the destination area, for destination decisions), since only those encounters
+    are captured by the engine snapshots.
+    """
+
+    def __init__(
+        self,
+        time_budget: Optional[float] = None,
+        node_budget: Optional[int] = 200,
+        max_depth: int = 10,
+        rollout_depth: int = configs.game.sim_depth,
+        exploration: float = 1.4,
+    ):
+        super().__init__(PlayerType.MCTS)
+        assert (
+            time_budget is not None or node_budget is not None
+        ), "MCTSPlayer needs a time or a node budget"
+        self.time_budget = time_budget
+        self.node_budget = node_budget
+        self.max_depth = max_depth
+        self.rollout_depth = rollout_depth
+        # exploration is scaled by the stress of a hero dying
+        self.exploration = exploration * configs.game.stress.hero_dies
+        # subtree of the last decision taken, reused by the next search
+        self.last_node: Optional[MCTSNode] = None
+
+    def pick_actions(self, **kwargs) -> int:
+        return self.search(kwargs["game_engine"], DecisionKind.ATTACK)
+
+    def pick_moving(self, **kwargs) -> Optional[int]:
+        return self.search(kwargs["game_engine"], DecisionKind.MOVE)
+
+    def pick_destination(self, **kwargs) -> Destination:
+        return self.search(kwargs["game_engine"], DecisionKind.DESTINATION)
+
+    def choose_disarm_trap(self, **kwargs) -> bool:
+        # There is no choice
+        return True
+
+    def choose_loot_treasure(self, **kwargs) -> LootingChoice:
+        return self.search(kwargs["game_engine"], DecisionKind.LOOT)
+
+    def get_root(self, context: Tuple) -> MCTSNode:
+        """Reuse the subtree of the last decision if it reached this position"""
+        if self.last_node is not None:
+            # the position may follow the last decision, or one opponent's decision
+            candidates = [
+                node
+                for node in [self.last_node, *self.last_node.children.values()]
+                if node.context == context
+            ]
+            if candidates:
+                return max(candidates, key=lambda node: node.visits)
+        return MCTSNode()
+
+    def search(self, game_engine: GameEngine, kind: DecisionKind) -> Any:
+        options = legal_options(game_engine, kind)
+        if len(options) == 1:
+            self.last_node = None
+            return options[0]
+        root = self.get_root(decision_context(game_engine))
+        token = game_engine.snapshot(
+            extra_encounters=(
+                destination_encounters(game_engine)
+                if kind == DecisionKind.DESTINATION
+                else None
+            )
+        )
+        start = time.perf_counter()
+        n = 0
+        with game_engine.msg_system.mute():
+            # anytime: stop on whichever budget runs out first
+            while (self.node_budget is None or n < self.node_budget) and (
+                self.time_budget is None
+                or time.perf_counter() - start < self.time_budget
+            ):
+                # every simulation samples its own outcomes, the game's are restored
+                game_engine.rng.reseed(game_engine.rng.policy.getrandbits(32))
+                self.simulate(game_engine, root)
+                game_engine.restore(token)
+                n += 1
+        # most visited option, the first one if none was simulated
+        keys = [(kind, option_key(option)) for option in options]
+        visits = [
+            root.children[key].visits if key in root.children else 0 for key in keys
+        ]
+        best = visits.index(max(visits))
+        self.last_node = root.children.get(keys[best], None)
+        return options[best]
+
+    def simulate(self, game_engine: GameEngine, root: MCTSNode) -> None:
+        """Run one simulation from the root, expanding the tree by one node"""
+        path = [root]
+        node = root
+        while len(path) <= self.max_depth:
+            kind = self.searchable_decision(game_engine, is_root=node is root)
+            if kind is None:
+                break
+            node.context = decision_context(game_engine)
+            options = legal_options(game_engine, kind)
+            if len(options) == 0:
+                break
+            keys = [(kind, option_key(option)) for option in options]
+            unexpanded = [i for i, key in enumerate(keys) if key not in node.children]
+            if unexpanded:
+                i = game_engine.rng.policy.choice(unexpanded)
+                node.children[keys[i]] = MCTSNode()
+            else:
+                i = self.select(node, keys, is_hero=decider_is_hero(game_engine))
+            apply_decision(game_engine, kind, options[i])
+            node = node.children[keys[i]]
+            path.append(node)
+            if unexpanded:
+                break
+        self.rollout(game_engine)
+        stress = game_engine.stress_system.stress
+        for node in path:
+            node.visits += 1
+            node.total_stress += stress
+
+    def select(self, node: MCTSNode, keys: List[Tuple], is_hero: bool) -> int:
+        """Pick the child with the highest upper confidence bound"""
+        sign = -1 if is_hero else 1
+        log_visits = math.log(max(1, node.visits))
+        scores = [
+            sign * node.children[key].mean_stress
+            + self.exploration * math.sqrt(log_visits / node.children[key].visits)
+            for key in keys
+        ]
+        return scores.index(max(scores))
+
+    def searchable_decision(
+        self, game_engine: GameEngine, is_root: bool
+    ) -> Optional[DecisionKind]:
+        """Get the current decision, None if the simulation should stop here"""
+        if game_engine.state in [GameState.GAME_OVER, GameState.WAVE_OVER]:
+            return None
+        kind = current_decision(game_engine)
+        if kind == DecisionKind.DESTINATION and not is_root:
+            return None
+        return kind
+
+    def rollout(self, game_engine: GameEngine) -> None:
+        """Play random decisions for a few steps"""
+        for _ in range(self.rollout_depth):
+            kind = self.searchable_decision(game_engine, is_root=False)
+            if kind is None:
+                break
+            options = legal_options(game_engine, kind)
+            if len(options) == 0:
+                break
+            apply_decision(game_engine, kind, game_engine.rng.policy.choice(options))
@@ -1,5 +1,3 @@
-import random
-
 from dungeon_despair.domain.entities.hero import Hero
 from engine.actions_engine import LootingChoice
 from engine.movement_engine import Destination
@@ -13,27 +11,30 @@ class RandomPlayer(Player):
 
     def pick_actions(self, **kwargs) -> int:
         actions = kwargs["actions"]
+        rng = kwargs["game_engine"].rng.policy
         active_actions = [action for action in actions if action.active]
-        random_action = random.choice(active_actions)
+        random_action = rng.choice(active_actions)
         return actions.index(random_action)
 
     def pick_moving(self, **kwargs) -> int:
         attacker_type = kwargs["attacker_type"]
         n_heroes = kwargs["n_heroes"]
         n_enemies = kwargs["n_enemies"]
+        rng = kwargs["game_engine"].rng.policy
         if attacker_type == Hero:
-            idx = random.choice(range(n_heroes))
+            idx = rng.choice(range(n_heroes))
             return idx
         else:
-            idx = random.choice(range(n_enemies))
+            idx = rng.choice(range(n_enemies))
             return idx + n_heroes
 
     def pick_destination(self, **kwargs) -> Destination:
         destinations = kwargs["destinations"]
-        return random.choice(destinations)
+        return kwargs["game_engine"].rng.policy.choice(destinations)
 
     def choose_disarm_trap(self, **kwargs) -> bool:
         return True
 
     def choose_loot_treasure(self, **kwargs) -> LootingChoice:
-        return random.choice(treasure_choices).looting_choice
+        rng = kwargs["game_engine"].rng.policy
+        return rng.choice(treasure_choices).looting_choice
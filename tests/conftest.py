@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# scenario played by the tests that need a full game, see the README
+SCENARIO_FILENAME = os.environ.get("DD_SCENARIO", "./my_scenarios/t5_v3.bin")
+
+
+@pytest.fixture
+def scenario():
+    pytest.importorskip("dungeon_despair")
+    if not os.path.exists(SCENARIO_FILENAME):
+        pytest.skip(f"No scenario at {SCENARIO_FILENAME}, set DD_SCENARIO")
+    from dungeon_despair.domain.level import Level
+
+    return Level.load_as_scenario(SCENARIO_FILENAME)
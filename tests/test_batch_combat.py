@@ -0,0 +1,90 @@
+import copy
+
+import numpy as np
+import pytest
+
+pytest.importorskip("dungeon_despair")
+
+from dd_cli import get_temp_heroes
+from engine.batch_combat import simulate_combats
+from engine.decision import apply_decision, current_decision, legal_options
+from engine.game_engine import GameEngine, GameState
+from player.random_player import RandomPlayer
+from utils import set_ingame_properties
+
+MAX_TURNS = 100
+
+
+def combat_room(scenario):
+    for room in scenario.rooms.values():
+        if len(room.encounter.enemies) > 0:
+            return room.name
+    pytest.skip("No room with a combat encounter in the scenario")
+
+
+def play_combat(scenario, room_name: str, seed: int):
+    """Play the combat of the room with random players.
+
+    Get whether the party was wiped, whether the combat ran out of turns and
+    the stress change.
+    """
+    scenario = copy.deepcopy(scenario)
+    scenario.current_room = room_name
+    eng = GameEngine(RandomPlayer(), RandomPlayer(), seed=seed)
+    eng.msg_system.muted = True
+    heroes = get_temp_heroes()
+    set_ingame_properties(game_data=scenario, heroes=heroes)
+    eng.heroes = heroes
+    eng.set_level(level=scenario)
+    # the kernel stops at the end of combat, so the modifiers ticking once the
+    # party is out of combat are not counted
+    after_combat = [0]
+    apply_and_tick = eng.modifier_system.apply_and_tick_modifiers
+
+    def apply_in_combat(entities):
+        stress = eng.stress_system.stress
+        apply_and_tick(entities)
+        if eng.state != GameState.IN_COMBAT:
+            after_combat[0] += eng.stress_system.stress - stress
+
+    eng.modifier_system.apply_and_tick_modifiers = apply_in_combat
+    stress = eng.stress_system.stress
+    eng.tick()
+    while (
+        eng.state == GameState.IN_COMBAT
+        and eng.combat_engine.turn_number <= MAX_TURNS
+    ):
+        kind = current_decision(eng)
+        # like RandomPlayer, never cancel a move
+        options = [o for o in legal_options(eng, kind) if o is not None] or [None]
+        apply_decision(eng, kind, eng.rng.policy.choice(options))
+    wiped = len(eng.heroes.party) == 0
+    timed_out = eng.state == GameState.IN_COMBAT
+    return wiped, timed_out, eng.stress_system.stress - stress - after_combat[0]
+
+
+def test_batch_combat_matches_engine(scenario):
+    room_name = combat_room(scenario)
+    outcomes = [play_combat(scenario, room_name, seed) for seed in range(300)]
+    wiped, timed_out, stress = (np.array(x, dtype=float) for x in zip(*outcomes))
+
+    heroes = get_temp_heroes()
+    set_ingame_properties(game_data=scenario, heroes=heroes)
+    batch = simulate_combats(
+        heroes=heroes,
+        encounter=scenario.rooms[room_name].encounter,
+        batch_size=3000,
+        seed=0,
+        max_turns=MAX_TURNS,
+    )
+
+    # within 4 standard errors of the difference, plus some slack
+    def tolerance(a: np.ndarray, b: np.ndarray) -> float:
+        return 4 * np.sqrt(a.var() / len(a) + b.var() / len(b)) + 0.02
+
+    batch_wiped = batch.wiped.astype(float)
+    assert abs(wiped.mean() - batch_wiped.mean()) <= tolerance(wiped, batch_wiped)
+    # combats cut short stop at slightly different points
+    stress = stress[timed_out == 0]
+    batch_stress = batch.stress_delta[~batch.timed_out].astype(float)
+    assert abs(stress.mean() - batch_stress.mean()) <= tolerance(stress, batch_stress)
@@ -0,0 +1,62 @@
+from functools import partial
+
+import numpy as np
+import pytest
+
+pytest.importorskip("dungeon_despair")
+
+from dd_cli import get_temp_heroes
+from engine.env import N_ACTIONS, OBS_SIZE, GameEnv
+from engine.vector_env import VectorEnv
+
+
+def play(env: GameEnv, seed: int, n_steps: int = 50):
+    """Play the first legal action until the episode ends, get the observations"""
+    obs, info = env.reset(seed=seed)
+    trace = [obs.copy()]
+    for _ in range(n_steps):
+        action = int(np.flatnonzero(info["action_mask"])[0])
+        obs, reward, terminated, truncated, info = env.step(action)
+        trace.append(obs.copy())
+        if terminated or truncated:
+            break
+    return trace
+
+
+def test_reset_and_step_are_deterministic(scenario):
+    env = GameEnv(scenario, get_temp_heroes)
+    first, second = play(env, seed=7), play(env, seed=7)
+    assert len(first) == len(second)
+    for a, b in zip(first, second):
+        assert np.array_equal(a, b)
+
+
+def test_action_mask(scenario):
+    env = GameEnv(scenario, get_temp_heroes)
+    obs, info = env.reset(seed=7)
+    mask = info["action_mask"]
+    assert obs.shape == (OBS_SIZE,)
+    assert mask.shape == (N_ACTIONS,)
+    assert set(np.unique(mask)) <= {0.0, 1.0}
+    assert mask.any()
+    if not mask.all():
+        with pytest.raises(ValueError):
+            env.step(int(np.flatnonzero(mask == 0)[0]))
+
+
+def test_vector_env_is_deterministic(scenario):
+    env_fns = [partial(GameEnv, scenario, get_temp_heroes)] * 2
+    traces = []
+    for _ in range(2):
+        vec_env = VectorEnv(env_fns, seed=3)
+        obs, masks = vec_env.reset()
+        trace = [obs.copy()]
+        for _ in range(20):
+            actions = np.array([np.flatnonzero(mask)[0] for mask in masks])
+            obs, rewards, dones, masks = vec_env.step(actions)
+            trace.append(obs.copy())
+        vec_env.close()
+        traces.append(trace)
+    assert obs.shape == (2, OBS_SIZE)
+    for a, b in zip(*traces):
+        assert np.array_equal(a, b)
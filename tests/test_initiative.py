@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from engine.initiative import InitiativeQueue
+from engine.rng import RNGService
+
+
+class FakeEntity:
+    def __init__(self, name: str, spd: float):
+        self.name = name
+        self.spd = spd
+        self.stunned = False
+
+
+class ListTurnOrder:
+    """Turn order as a sorted list, as the combat engine used to keep it"""
+
+    def roll(self, entities, rng) -> None:
+        initiative = [entity.spd * 10 + rng.randint(1, 10) for entity in entities]
+        order = sorted(enumerate(initiative), key=lambda x: x[1])
+        self.sorted_entities = [entities[i] for i, _ in order]
+        self.currently_active = -1
+
+    def next_attacker(self, is_stunned):
+        for i in range(self.currently_active + 1, len(self.sorted_entities)):
+            entity = self.sorted_entities[i]
+            if not is_stunned(entity):
+                self.currently_active = i
+                return entity
+        return None
+
+    def remove(self, entity) -> None:
+        self.sorted_entities.remove(entity)
+
+    @property
+    def attacker(self):
+        return self.sorted_entities[self.currently_active]
+
+
+def attacker_or_none(order):
+    try:
+        return order.attacker
+    except IndexError:
+        return None
+
+
+def play(order, seed: int, n_turns: int = 30):
+    """Play turns with random deaths and stuns, get the attackers seen"""
+    script = random.Random(seed)
+    rng = RNGService(seed)
+    speeds = [script.choice([0.2, 0.5, 0.5]) for _ in range(10)]
+    entities = [FakeEntity(f"e{i}", spd) for i, spd in enumerate(speeds)]
+    is_stunned = lambda entity: entity.stunned
+    trace = []
+    for _ in range(n_turns):
+        if len(entities) == 0:
+            break
+        order.roll(entities, rng.initiative)
+        while True:
+            attacker = order.next_attacker(is_stunned)
+            trace.append(None if attacker is None else attacker.name)
+            if attacker is None:
+                break
+            # anyone can die during an attack, including the attacker
+            dead = [e for e in entities if script.random() < 0.02]
+            for entity in dead:
+                entities.remove(entity)
+                order.remove(entity)
+            if len(dead) > 0:
+                current = attacker_or_none(order)
+                trace.append(None if current is None else current.name)
+            for entity in entities:
+                if script.random() < 0.15:
+                    entity.stunned = not entity.stunned
+    return trace
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_same_attackers_as_list_turn_order(seed):
+    assert play(InitiativeQueue(), seed) == play(ListTurnOrder(), seed)
@@ -0,0 +1,36 @@
+import copy
+import random
+
+import pytest
+
+pytest.importorskip("dungeon_despair")
+
+from dd_cli import _replay_run, _simulate_scenario, RunData
+from engine.game_engine import GameState
+
+
+@pytest.mark.parametrize("simulation_type", ["random", "ai"])
+def test_replay_matches_recorded_run(scenario, simulation_type):
+    max_steps = 150
+    random.seed(11)
+    run_data = RunData()
+    _simulate_scenario(
+        scenario=copy.deepcopy(scenario),
+        simulation_type=simulation_type,
+        run_data=run_data,
+        max_steps=max_steps,
+        log_events=False,
+        seed=11,
+    )
+    eng, n_step = _replay_run(
+        scenario=copy.deepcopy(scenario),
+        seed=run_data.seed,
+        decisions=run_data.decisions,
+        n_steps=run_data.n_steps,
+    )
+    assert n_step == run_data.n_steps
+    assert eng.stress_system.stress == run_data.stress_trace[-1]
+    assert eng.stress_system.breakdown() == run_data.stress_breakdown
+    # the run is over in the replay iff it ended before the steps ran out
+    game_over = eng.state == GameState.GAME_OVER
+    assert game_over == (run_data.n_steps < max_steps)
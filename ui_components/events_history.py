@@ -2,6 +2,8 @@ from pygame import Rect
 from pygame_gui.core.interfaces import IUIManagerInterface
 from pygame_gui.elements import UITextBox, UIWindow
 
+from engine.message_system import Event
+
 
 class EventsHistory(UIWindow):
     def __init__(self, rect: Rect, ui_manager: IUIManagerInterface):
@@ -32,5 +34,8 @@ class EventsHistory(UIWindow):
             self.history_display.scroll_bar.start_percentage = 1.0
             self.history_display.scroll_bar.rebuild()
 
+    def add_event_and_scroll(self, event: Event):
+        self.add_text_and_scroll(event.render())
+
     def get_last_events(self, n: int):
         return self.history[-n:]
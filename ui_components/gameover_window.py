@@ -6,7 +6,6 @@ from pygame_gui.core.interfaces import IUIManagerInterface
 from pygame_gui.elements import UIWindow, UIImage, UILabel
 
 from configs import configs, resource_path
-from engine.stress_system import stress_system
 
 
 class GameOver(UIWindow):
@@ -25,7 +24,7 @@ class GameOver(UIWindow):
         self.background_image: Optional[UIImage] = None
         self.score_str: Optional[UILabel] = None
 
-    def toggle(self):
+    def toggle(self, score: int):
         self.background_image = UIImage(
             relative_rect=pygame.rect.Rect(
                 0, 0, self.relative_rect.width, self.relative_rect.height
@@ -44,7 +43,7 @@ class GameOver(UIWindow):
                 self.get_container().rect.width / 4,
                 self.get_container().rect.height / 8,
             ),
-            text=f"Your Score: {stress_system.score}",
+            text=f"Your Score: {score}",
             container=self.get_container(),
             manager=self.ui_manager,
         )
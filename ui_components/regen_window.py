@@ -8,10 +8,8 @@ from pygame_gui.core.gui_type_hints import RectLike, Coordinate
 from pygame_gui.core.interfaces import IUIManagerInterface, IContainerLikeInterface
 from pygame_gui.elements import UIWindow, UIImage, UILabel, UIButton, UIPanel
 from engine.game_engine import GameEngine, GameState
-from engine.stress_system import stress_system
-from engine.message_system import msg_system
 from configs import configs
-from utils import get_entities_differences, reset_entity
+from utils import get_entities_differences
 
 
 class Checkbox(UIButton):
@@ -60,7 +58,7 @@ class RegenPicker(UIWindow):
         self.game_engine = game_engine
 
         self.stress_label: Optional[UILabel] = None
-        self.make_stress_label(amount=stress_system.stress)
+        self.make_stress_label(amount=game_engine.stress_system.stress)
 
         self.diff_entities, self.locations = get_entities_differences(
             ref_level=level_copy, curr_level=game_engine.scenario
@@ -177,7 +175,9 @@ class RegenPicker(UIWindow):
             for i, checkbox in enumerate(self.checkboxes):
                 if checkbox.text == checkbox.ticked:
                     self.spending += self.diff_entities[i].cost
-            self.make_stress_label(amount=stress_system.stress - self.spending)
+            self.make_stress_label(
+                amount=self.game_engine.stress_system.stress - self.spending
+            )
             if self.spending > 0:
                 self.regen_button.enable()
             else:
@@ -185,7 +185,7 @@ class RegenPicker(UIWindow):
             for i, checkbox in enumerate(self.checkboxes):
                 if checkbox.text == checkbox.unticked:
                     if (
-                        stress_system.stress
+                        self.game_engine.stress_system.stress
                         < self.spending + self.diff_entities[i].cost
                     ):
                         checkbox.disable()
@@ -198,18 +198,19 @@ class RegenPicker(UIWindow):
         max_cost = sum([x.cost for x in self.diff_entities])
         for i, (entity, location) in enumerate(zip(self.diff_entities, self.locations)):
             if self.checkboxes[i].text == self.checkboxes[i].ticked:
-                reset_entity(
-                    ref_level=self.level_copy,
-                    curr_level=self.game_engine.scenario,
-                    entity=entity,
-                    location=location,
+                self.game_engine.regenerate_entity(
+                    ref_level=self.level_copy, entity=entity, location=location
                 )
-                stress_system.stress -= entity.cost
+                self.game_engine.stress_system.process_regen(cost=entity.cost)
 
         if self.spending == max_cost:
-            msg_system.add_msg("The dungeon has been fully regenerated!")
+            self.game_engine.msg_system.add_msg(
+                "The dungeon has been fully regenerated!"
+            )
         else:
-            msg_system.add_msg("The dungeon has been partially regenerated...")
+            self.game_engine.msg_system.add_msg(
+                "The dungeon has been partially regenerated..."
+            )
 
         self.game_engine.state = GameState.NEXT_WAVE
         self.kill()
@@ -154,10 +154,12 @@ def get_entities_differences(
 
 def reset_entity(
     ref_level: Level, curr_level: Level, entity: Entity, location: str
-) -> None:
+) -> int:
+    """Restore the entity in the current level, returning how many times it was added"""
+
     def add_or_replace_entity(
         entity: Entity, encounter: Encounter, entity_t: Optional[EntityEnum] = None
-    ) -> None:
+    ) -> bool:
         if entity_t is None:
             if isinstance(entity, Enemy):
                 entity_t = EntityEnum.ENEMY
@@ -168,12 +170,17 @@ def reset_entity(
         names = [x.name for x in encounter.entities[entity_t.value]]
         if entity.name in names:
             encounter.entities[entity_t.value][names.index(entity.name)] = entity
+            return False
         else:
             encounter.entities[entity_t.value].append(entity)
+            return True
 
+    added = 0
     if location in curr_level.rooms.keys():
-        add_or_replace_entity(
-            entity=entity, encounter=curr_level.rooms[location].encounter
+        added = int(
+            add_or_replace_entity(
+                entity=entity, encounter=curr_level.rooms[location].encounter
+            )
         )
     else:
         for i, encounter in enumerate(curr_level.corridors[location].encounters):
@@ -190,6 +197,7 @@ def reset_entity(
                 .entities[entity_t.value]
             ]
             if entity.name in ref_names:
-                add_or_replace_entity(
+                added += add_or_replace_entity(
                     entity=entity, encounter=encounter, entity_t=entity_t
                 )
+    return added